@@ -14,4 +14,6 @@ Base classes for defining accounts at financial institutions.
 ## Imports
 ##########################################################################
 
+from .balances import bulk_mode, deferred_balances
+
 default_app_config = 'accounts.apps.AccountsConfig'
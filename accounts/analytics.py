@@ -0,0 +1,203 @@
+# accounts.analytics
+# Time series of account balances across balance sheets.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 19:02:44 2026 -0400
+#
+# ID: analytics.py [] benjamin@bengfort.com $
+
+"""
+Time series of account balances across balance sheets.
+
+A series is described by a metric (the beginning or ending balances, the change
+between them, or the ending balance as a percent of the beginning balance) of the
+active, non-excluded accounts of one or more account types, optionally compared with
+the previous balance sheet (the difference or the percent of the previous value). A
+TimeSeries compiles any number of series into a single grouped query over the
+balances that returns one row per balance sheet date for the most recent sheets, so
+that new charts only need to describe their series rather than write new SQL.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from django.db import models
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import Cast, Lag, NullIf, RowNumber
+
+from .models import Balance
+
+
+# Metrics of the balances of each sheet
+BEGINNING = "beginning"
+ENDING = "ending"
+CHANGE = "change"
+RATIO = "ratio"
+METRICS = (BEGINNING, ENDING, CHANGE, RATIO)
+
+# Comparisons of a metric with the previous sheet
+DIFFERENCE = "difference"
+PERCENT = "percent"
+COMPARISONS = (None, DIFFERENCE, PERCENT)
+
+
+##########################################################################
+## Series
+##########################################################################
+
+class Series(object):
+    """
+    Describes a single column of a time series: the metric of the balances of the
+    accounts of the specified types on each sheet, optionally compared with the
+    metric on the previous sheet. The name is the key of the column in the results.
+    """
+
+    def __init__(self, name, types, metric=ENDING, comparison=None):
+        if metric not in METRICS:
+            raise ValueError("unknown metric {!r}".format(metric))
+
+        if comparison not in COMPARISONS:
+            raise ValueError("unknown comparison {!r}".format(comparison))
+
+        if isinstance(types, str):
+            types = (types,)
+
+        if not types:
+            raise ValueError("at least one account type is required")
+
+        self.name = name
+        self.types = tuple(types)
+        self.metric = metric
+        self.comparison = comparison
+
+    def total(self, field):
+        """
+        Returns the sum of the field for the balances of the series account types.
+        """
+        return Sum(field, filter=Q(account__type__in=self.types))
+
+    def value(self):
+        """
+        Returns the expression that computes the metric for a sheet.
+        """
+        if self.metric == CHANGE:
+            return self.total(ENDING) - self.total(BEGINNING)
+
+        if self.metric == RATIO:
+            return percent(self.total(ENDING), self.total(BEGINNING))
+
+        return self.total(self.metric)
+
+    def expression(self, order_by):
+        """
+        Returns the expression of the column, comparing the metric with the metric
+        of the previous sheet (in the specified order) using a window function.
+        """
+        value = self.value()
+        if self.comparison is None:
+            return value
+
+        if self.comparison == DIFFERENCE:
+            previous = Window(expression=Lag(self.value()), order_by=order_by)
+            return value - previous
+
+        # The window must be the outermost expression of the previous value, otherwise
+        # it is mistaken for a column to group by (the zero check happens in the lag).
+        previous = Window(
+            expression=Lag(NullIf(as_float(self.value()), 0.0)), order_by=order_by,
+        )
+        return as_float(value) * 100.0 / previous
+
+    def __repr__(self):
+        return "<Series {} {} of {}{}>".format(
+            self.name, self.metric, ", ".join(self.types),
+            " ({})".format(self.comparison) if self.comparison else "",
+        )
+
+
+def percent(numerator, denominator):
+    """
+    Returns an expression of the numerator as a percent of the denominator, which
+    is None if the denominator is zero.
+    """
+    return as_float(numerator) * 100.0 / NullIf(as_float(denominator), 0.0)
+
+
+def as_float(expression):
+    return Cast(expression, models.FloatField())
+
+
+##########################################################################
+## Time Series
+##########################################################################
+
+class TimeSeries(object):
+    """
+    Compiles series into a single query that returns a row for each of the most
+    recent balance sheet dates (limited by window) with the date and a column for
+    each of the series, ordered from the most recent sheet. Comparisons with the
+    previous sheet are computed over every sheet before the window is applied, so
+    the oldest row in the window is still compared with the sheet before it.
+    """
+
+    def __init__(self, series, window=12):
+        if not series:
+            raise ValueError("at least one series is required")
+
+        # Series names are annotations, so they cannot clash with the balance fields
+        reserved = {"date", "sheet_number"}
+        for field in Balance._meta.get_fields():
+            reserved.update({field.name, getattr(field, "attname", field.name)})
+
+        names = [s.name for s in series]
+        if len(set(names)) != len(names) or reserved.intersection(names):
+            raise ValueError(
+                "series must have unique names other than {}".format(
+                    ", ".join(sorted(reserved))
+                )
+            )
+
+        if window is not None and window < 1:
+            raise ValueError("window must be a positive number of sheets")
+
+        self.series = series
+        self.window = window
+
+    def query(self):
+        """
+        Returns the values queryset of the time series.
+        """
+        types = {code for series in self.series for code in series.types}
+        order_by = F("sheet__date").asc()
+
+        queryset = (
+            Balance.objects.filter(
+                account__active=True, account__exclude=False, account__type__in=types,
+            )
+            .order_by()
+            .values(date=F("sheet__date"))
+            .annotate(**{
+                series.name: series.expression(order_by) for series in self.series
+            })
+        )
+
+        if self.window is not None:
+            queryset = queryset.annotate(
+                sheet_number=Window(
+                    expression=RowNumber(), order_by=F("sheet__date").desc()
+                )
+            ).filter(sheet_number__lte=self.window)
+
+        return queryset.order_by("-date")
+
+    def results(self):
+        """
+        Executes the query and returns a list of rows (dictionaries of the date and
+        the series values), most recent first.
+        """
+        columns = ["date"] + [series.name for series in self.series]
+        return [
+            {column: row[column] for column in columns}
+            for row in self.query()
+        ]
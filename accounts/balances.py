@@ -0,0 +1,164 @@
+# accounts.balances
+# Coordinates the maintenance of ending balances across batches of changes.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 11:02:17 2026 -0400
+#
+# ID: balances.py [] benjamin@bengfort.com $
+
+"""
+Coordinates the maintenance of ending balances across batches of changes.
+
+Normally the signals apply the change in each saved or deleted transaction to the
+ending balances as soon as it happens. Inside of a deferred_balances block, the
+signals instead record which (sheet, account) balances have been touched and all of
+them are recomputed with a single set-based statement when the database transaction
+commits, so a burst of writes against a handful of accounts costs one recompute.
+
+For imports, data migrations, and fixture loads, bulk_mode goes further: the signals
+only record the sheets that were touched, bulk_create and bulk_update may be used for
+transactions and balances, and every balance on the touched sheets is recomputed in
+one statement when the block exits. Transactions remember the sheet they were loaded
+from, so saving them does not query the stored row unless they were not loaded from
+the database (e.g. a transaction constructed with an existing primary key).
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import threading
+
+from functools import partial
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+
+
+# Thread local state for the deferred blocks
+_state = threading.local()
+
+# Above this many balances, recompute by sheet and account rather than by pair
+MAX_BALANCE_PAIRS = 64
+
+
+##########################################################################
+## Deferred Balances
+##########################################################################
+
+def dirty_balances():
+    """
+    Returns the set of (sheet_id, account_id) keys whose balances are waiting to be
+    recomputed by the current deferred block, or None if balances are not deferred.
+    """
+    return getattr(_state, "dirty", None)
+
+
+def bulk_sheets():
+    """
+    Returns the set of sheet ids whose balances will be recomputed when the current
+    bulk_mode block exits, or None if the ledger is not in bulk mode.
+    """
+    return getattr(_state, "sheets", None)
+
+
+def mark_dirty(keys):
+    """
+    Records the (sheet_id, account_id) keys as needing to be recomputed if ending
+    balance updates are currently deferred or the ledger is in bulk mode (in which
+    case only the sheet is recorded). Returns True if the keys were recorded,
+    otherwise False, in which case the caller must update the balances itself.
+    """
+    sheets = bulk_sheets()
+    if sheets is not None:
+        sheets.update(sheet_id for sheet_id, _ in keys)
+        return True
+
+    dirty = dirty_balances()
+    if dirty is None:
+        return False
+
+    dirty.update(keys)
+    return True
+
+
+def recompute_balances(keys, using=None):
+    """
+    Recomputes the ending balances for the (sheet_id, account_id) keys in a single
+    statement, ignoring any keys that do not have a balance on the sheet. Large
+    batches select the balances of every touched account on every touched sheet
+    rather than each pair, which keeps the statement small; recomputing a balance
+    that is already correct does not change it.
+    """
+    if not keys:
+        return 0
+
+    Balance = apps.get_model("accounts", "Balance")
+    balances = Balance.objects.using(using)
+
+    if len(keys) > MAX_BALANCE_PAIRS:
+        sheets = {sheet_id for sheet_id, _ in keys}
+        accounts = {account_id for _, account_id in keys}
+        return balances.filter(
+            sheet_id__in=sheets, account_id__in=accounts
+        ).recompute_ending()
+
+    match = Q()
+    for sheet_id, account_id in keys:
+        match |= Q(sheet_id=sheet_id, account_id=account_id)
+    return balances.filter(match).recompute_ending()
+
+
+@contextmanager
+def deferred_balances(using=None):
+    """
+    Runs the block in a database transaction and defers the ending balance updates
+    of any transactions saved or deleted in it until the transaction commits, when
+    the touched balances are recomputed once. Blocks may be nested, in which case
+    the outermost block collects the balances and registers the recompute. Note that
+    the ending balances are stale until the recompute runs on commit.
+    """
+    if dirty_balances() is not None:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    dirty = _state.dirty = set()
+    try:
+        with transaction.atomic(using=using):
+            yield
+            transaction.on_commit(partial(recompute_balances, dirty, using), using=using)
+    finally:
+        _state.dirty = None
+
+
+##########################################################################
+## Bulk Mode
+##########################################################################
+
+@contextmanager
+def bulk_mode(using=None):
+    """
+    Runs the block in a database transaction with per-row ending balance maintenance
+    suspended. Saves, deletes, and bulk creates or updates of transactions and
+    balances record the sheets they touch and all of the balances on those sheets
+    are recomputed with a single statement when the block exits. Blocks may be
+    nested, in which case the outermost block recomputes the balances.
+    """
+    if bulk_sheets() is not None:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    sheets = _state.sheets = set()
+    try:
+        with transaction.atomic(using=using):
+            yield
+
+            if sheets:
+                Balance = apps.get_model("accounts", "Balance")
+                Balance.objects.using(using).filter(sheet_id__in=sheets).recompute_ending()
+    finally:
+        _state.sheets = None
@@ -0,0 +1,71 @@
+# accounts.cache
+# Process-local caching of the balance sheet currently being worked on.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 16:04:52 2026 -0400
+#
+# ID: cache.py [] benjamin@bengfort.com $
+
+"""
+Process-local caching of the balance sheet currently being worked on.
+
+Every page that renders the next_sheet tag needs the current balance sheet, which
+rarely changes. Each process keeps the sheet for the current billing month along
+with the version stamp of the balance sheets that was current when it was fetched.
+Saving or deleting a balance sheet changes the version stamp in the shared Django
+cache, so the other processes (e.g. gunicorn workers) refetch the sheet on their
+next render; otherwise rendering the tag only reads the version stamp.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import uuid
+
+from django.core.cache import cache
+
+from .utils import billing_month
+from .models import BalanceSheet
+
+
+# Shared cache key of the version stamp of the balance sheets
+SHEETS_VERSION_KEY = "accounts:balance_sheets:version"
+
+# Process local cache of the (year, month) of the billing month to (version, sheet)
+_current = {}
+
+
+##########################################################################
+## Current Sheet Cache
+##########################################################################
+
+def get_current_sheet():
+    """
+    Returns the balance sheet for the current billing month (or None if it has not
+    been created yet), only querying the database if the billing month has changed
+    or a balance sheet has been saved or deleted since it was last fetched.
+    """
+    # Before the billing day the billing month is today, so key by the month only
+    month = billing_month()
+    month = (month.year, month.month)
+    version = cache.get(SHEETS_VERSION_KEY)
+
+    cached = _current.get(month)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    sheet = BalanceSheet.objects.get_current(raise_on_error=False)
+
+    _current.clear()
+    _current[month] = (version, sheet)
+    return sheet
+
+
+def invalidate_current_sheet():
+    """
+    Clears the current sheet of this process and changes the shared version stamp
+    so that every other process refetches the current sheet.
+    """
+    _current.clear()
+    cache.set(SHEETS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
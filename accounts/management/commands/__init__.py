@@ -0,0 +1,14 @@
+# accounts.management.commands
+# Management commands for the accounts app.
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sun Oct 18 10:12:44 2026 -0400
+#
+# Copyright (C) 2026 Bengfort.com
+# For license information, see LICENSE
+#
+# ID: __init__.py [] benjamin@bengfort.com $
+
+"""
+Management commands for the accounts app.
+"""
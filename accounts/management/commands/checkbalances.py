@@ -0,0 +1,70 @@
+# accounts.management.commands.checkbalances
+# Verify stored ending balances against a full recompute of their transactions.
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sun Oct 18 10:12:44 2026 -0400
+#
+# Copyright (C) 2026 Bengfort.com
+# For license information, see LICENSE
+#
+# ID: checkbalances.py [] benjamin@bengfort.com $
+
+"""
+Verify stored ending balances against a full recompute of their transactions.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from accounts.models import BalanceSheet, Balance
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+
+    help = "Verify ending balances against a full recompute of their transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s", "--sheet", default=None, metavar="YYYY-MM",
+            help="only check the balances on the sheet for the specified month",
+        )
+        parser.add_argument(
+            "-f", "--fix", action="store_true",
+            help="save the recomputed ending balance of balances that have drifted",
+        )
+
+    def handle(self, *args, **options):
+        balances = Balance.objects.select_related("sheet", "account__bank")
+
+        if options["sheet"]:
+            try:
+                sheet = BalanceSheet.objects.get_date(options["sheet"])
+            except (ValueError, BalanceSheet.DoesNotExist):
+                raise CommandError(f"no balance sheet found for {options['sheet']}")
+            balances = balances.filter(sheet=sheet)
+
+        n, drifted = 0, []
+        for balance in balances:
+            n += 1
+            stored = balance.ending
+            balance.update_ending_balance()
+            if balance.ending == stored:
+                continue
+
+            drifted.append(balance.pk)
+            self.stdout.write(self.style.WARNING(
+                f"{balance.account} on {balance.date}: stored ending {stored} "
+                f"does not match recomputed ending {balance.ending}"
+            ))
+
+        if drifted and options["fix"]:
+            Balance.objects.filter(pk__in=drifted).recompute_ending()
+        elif drifted:
+            raise CommandError(f"{len(drifted)} of {n} ending balances have drifted")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"checked {n} ending balances, {len(drifted)} fixed" if drifted else
+            f"checked {n} ending balances, all match their transactions"
+        ))
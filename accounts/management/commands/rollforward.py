@@ -0,0 +1,56 @@
+# accounts.management.commands.rollforward
+# Create next month's balance sheet from the latest balance sheet.
+#
+# Author:   Benjamin Bengfort <benjamin@bengfort.com>
+# Created:  Sun Oct 18 14:36:09 2026 -0400
+#
+# Copyright (C) 2026 Bengfort.com
+# For license information, see LICENSE
+#
+# ID: rollforward.py [] benjamin@bengfort.com $
+
+"""
+Create next month's balance sheet from the latest balance sheet.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from datetime import datetime
+from accounts.models import BalanceSheet
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+
+    help = "Create next month's balance sheet, carrying balances and payments forward"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-d", "--date", default=None, metavar="YYYY-MM-DD",
+            help="the date of the new balance sheet (one month after the latest)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            latest = BalanceSheet.objects.latest()
+        except BalanceSheet.DoesNotExist:
+            raise CommandError("no balance sheet to roll forward from")
+
+        date = None
+        if options["date"]:
+            try:
+                date = datetime.strptime(options["date"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError(f"could not parse date {options['date']}")
+
+        try:
+            sheet = latest.roll_forward(date=date)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"created {sheet} with {sheet.balances.count()} balances and "
+            f"{sheet.transactions.count()} pending transactions"
+        ))
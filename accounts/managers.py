@@ -14,14 +14,75 @@ Query managers for the accounts models.
 ## Imports
 ##########################################################################
 
-from django.db import models
-from django.db.models import Sum
-from django.conf import settings
-
+from .utils import billing_month
+from .balances import mark_dirty, recompute_balances
+
+from django.apps import apps
+from django.core.exceptions import EmptyResultSet
+from django.db import models, transaction, connections
+from django.db.models import Sum, Count
+from django.db.models.functions import Coalesce, FirstValue, Lag
+from django.db.models import F, Q, Case, When, Value, OuterRef, Subquery, Window
+
+from decimal import Decimal
+from collections import defaultdict
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 
 
+##########################################################################
+## Queries
+##########################################################################
+
+# Sets the ending balance of the selected balances to their beginning balance plus
+# the signed total of their pending transactions (credits are negative and debits
+# are positive). Only the transactions of the selected balances' sheets and accounts
+# are summed, and balances whose ending balance is already correct are not rewritten.
+RECOMPUTE_ENDING_SQL = (
+    "UPDATE {balances} SET ending = b.beginning + COALESCE(t.total, 0)"
+    "  FROM {balances} b LEFT JOIN ("
+    "    SELECT sheet_id, account_id, SUM(amount) AS total FROM ("
+    "      SELECT sheet_id, credit_id AS account_id, -amount AS amount"
+    "        FROM {transactions} WHERE NOT complete AND (sheet_id, credit_id) IN ("
+    "          SELECT sheet_id, account_id FROM {balances} WHERE id IN ({selected}))"
+    "      UNION ALL"
+    "      SELECT sheet_id, debit_id AS account_id, amount"
+    "        FROM {transactions} WHERE NOT complete AND (sheet_id, debit_id) IN ("
+    "          SELECT sheet_id, account_id FROM {balances} WHERE id IN ({selected}))"
+    "    ) entries"
+    "    GROUP BY sheet_id, account_id"
+    "  ) t ON t.sheet_id = b.sheet_id AND t.account_id = b.account_id"
+    " WHERE {balances}.id = b.id AND b.id IN ({selected})"
+    "   AND {balances}.ending IS DISTINCT FROM b.beginning + COALESCE(t.total, 0)"
+)
+
+
+# Fields that change which balances a transaction contributes to or by how much, and
+# the fields that change the ending balance of a balance.
+TRANSACTION_BALANCE_FIELDS = {"sheet", "credit", "debit", "amount", "complete"}
+BALANCE_ENDING_FIELDS = {"sheet", "account", "beginning"}
+
+
+# Creates a balance on the target sheet for each of the selected balances whose
+# beginning (and ending, until transactions are added) balance is the ending balance
+# of the selected balance.
+CARRY_FORWARD_SQL = (
+    "INSERT INTO {balances} (sheet_id, account_id, beginning, ending)"
+    " SELECT %s, account_id, ending, ending FROM {balances} WHERE id IN ({selected})"
+)
+
+
+# The credit and debit totals of the transactions for a balance, split by pending and
+# completed transactions, keyed by whether the account is credited on the transaction
+# and whether or not the transaction is complete.
+TRANSACTION_TOTALS = {
+    "credits_pending": ("credit_id", False),
+    "credits_completed": ("credit_id", True),
+    "debits_pending": ("debit_id", False),
+    "debits_completed": ("debit_id", True),
+}
+
+
 ##########################################################################
 ## Querysets
 ##########################################################################
@@ -68,6 +129,144 @@ class BalanceQuerySet(models.QuerySet):
             Sum("beginning"), Sum("ending")
         )
 
+    def with_transaction_totals(self):
+        """
+        Annotates each balance with the credit and debit totals of its transactions
+        on its sheet (credits negative, debits positive) split by pending and
+        completed, using the keys of TRANSACTION_TOTALS; the totals are zero rather
+        than None for an account without transactions.
+        """
+        Transaction = apps.get_model("accounts", "Transaction")
+        amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+        annotations = {}
+        for key, (account, complete) in TRANSACTION_TOTALS.items():
+            total = Transaction.objects.filter(
+                sheet_id=OuterRef("sheet_id"), complete=complete,
+                **{account: OuterRef("account_id")}
+            ).order_by().values(account).annotate(total=Sum("amount")).values("total")
+
+            total = Coalesce(Subquery(total), Value(Decimal(0)), output_field=amount)
+            annotations[key] = -total if account == "credit_id" else total
+
+        return self.annotate(**annotations)
+
+    def adjust_ending(self, deltas):
+        """
+        Applies signed deltas to the ending balances in a single UPDATE statement,
+        where deltas is a dictionary of (sheet_id, account_id) keys to the amount
+        that the ending balance has changed by. The new ending balance is computed
+        by the database from the stored value (e.g. ending = ending + delta) so that
+        concurrent adjustments to the same balance cannot overwrite each other.
+
+        Returns the number of balances updated; keys that do not have a balance on
+        the sheet are ignored.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        match = Q()
+        cases = []
+        for (sheet_id, account_id), delta in deltas.items():
+            key = Q(sheet_id=sheet_id, account_id=account_id)
+            match |= key
+            cases.append(When(key, then=Value(delta)))
+
+        amount = models.DecimalField(max_digits=10, decimal_places=2)
+        delta = Case(*cases, default=Value(Decimal(0)), output_field=amount)
+        return self.filter(match).update(ending=F("ending") + delta)
+
+    def recompute_ending(self):
+        """
+        Recomputes the ending balance of every balance in the queryset from the
+        beginning balance and the pending transactions on its sheet using a single
+        UPDATE statement, rather than two aggregates and a save per balance.
+
+        Returns the number of balances whose ending balance was changed.
+        """
+        selection = self._selected_sql()
+        if selection is None:
+            return 0
+
+        connection = connections[self.db]
+        Transaction = apps.get_model("accounts", "Transaction")
+        selected, params = selection
+
+        sql = RECOMPUTE_ENDING_SQL.format(
+            balances=connection.ops.quote_name(self.model._meta.db_table),
+            transactions=connection.ops.quote_name(Transaction._meta.db_table),
+            selected=selected,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params * 3)
+            return cursor.rowcount
+
+    def _selected_sql(self):
+        """
+        Returns the SQL and parameters selecting the pks of the queryset, compiled
+        for its database, or None if the queryset cannot match any balances.
+        """
+        query = self.order_by().values("pk").query
+        try:
+            return query.get_compiler(self.db).as_sql()
+        except EmptyResultSet:
+            return None
+
+    def carry_forward(self, sheet):
+        """
+        Creates a balance on the sheet for every balance in the queryset, whose
+        beginning balance is the ending balance of the original, with a single
+        INSERT ... SELECT statement (so no signals are sent).
+
+        Returns the number of balances created.
+        """
+        selection = self._selected_sql()
+        if selection is None:
+            return 0
+
+        connection = connections[self.db]
+        selected, params = selection
+
+        sql = CARRY_FORWARD_SQL.format(
+            balances=connection.ops.quote_name(self.model._meta.db_table),
+            selected=selected,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (sheet.pk,) + params)
+            return cursor.rowcount
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Creates the balances without sending signals, then computes their ending
+        balances with a single statement (or when the bulk_mode block exits).
+        """
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self._recompute_bulk(objs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """
+        Updates the balances without sending signals, recomputing the ending balance
+        of the updated balances if the beginning balance, sheet, or account changed.
+        """
+        with transaction.atomic(using=self.db):
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            if BALANCE_ENDING_FIELDS.intersection(fields):
+                self._recompute_bulk(objs)
+        return rows
+
+    def _recompute_bulk(self, objs):
+        if mark_dirty({(obj.sheet_id, obj.account_id) for obj in objs}):
+            return
+
+        pks = [obj.pk for obj in objs if obj.pk is not None]
+        if pks:
+            self.model.objects.using(self.db).filter(pk__in=pks).recompute_ending()
+
 
 ##########################################################################
 ## Account Type Managers
@@ -109,6 +308,15 @@ class AccountBalanceTypeManager(models.Manager):
     def charitable_accounts(self):
         return self.get_queryset().charitable_accounts()
 
+    def with_transaction_totals(self):
+        return self.get_queryset().with_transaction_totals()
+
+    def adjust_ending(self, deltas):
+        return self.get_queryset().adjust_ending(deltas)
+
+    def recompute_ending(self):
+        return self.get_queryset().recompute_ending()
+
 
 ##########################################################################
 ## Balance Sheet Manager
@@ -116,6 +324,32 @@ class AccountBalanceTypeManager(models.Manager):
 
 class BalanceSheetQuerySet(models.QuerySet):
 
+    def with_summary_counts(self):
+        """
+        Annotates the number of transactions on each sheet as num_transactions and
+        the number of accounts of each type with a balance on the sheet as
+        num_accounts_<type> (e.g. num_accounts_Ca), so that sheet summaries do not
+        require additional count queries per sheet.
+        """
+        Account = apps.get_model("accounts", "Account")
+        Transaction = apps.get_model("accounts", "Transaction")
+
+        transactions = (
+            Transaction.objects.filter(sheet=OuterRef("pk"))
+            .order_by().values("sheet").annotate(count=Count("pk")).values("count")
+        )
+
+        accounts = {
+            f"num_accounts_{code}": Count(
+                "balances", filter=Q(balances__account__type=code)
+            )
+            for code, _ in Account.ACCOUNT_TYPES
+        }
+
+        return self.annotate(
+            num_transactions=Coalesce(Subquery(transactions), 0), **accounts
+        )
+
     def get_month(self, year, month):
         """
         Returns the balance sheet for the specified year and month (ints). This
@@ -123,8 +357,15 @@ class BalanceSheetQuerySet(models.QuerySet):
         month combo exists and raises a MultipleObjectsReturned error if there
         are multiple balance sheet objects for the specified year and month.
         """
-        queryset = self.filter(date__year=year).filter(date__month=month)
-        return queryset.get()
+        return self.in_month(year, month).get()
+
+    def in_month(self, year, month):
+        """
+        Filters the balance sheets dated in the specified year and month (ints) with
+        a half-open date range so that the lookup can use the index on the date.
+        """
+        start = date(year, month, 1)
+        return self.filter(date__gte=start, date__lt=start + relativedelta(months=1))
 
     def get_date(self, day):
         """
@@ -143,10 +384,17 @@ class BalanceSheetManager(models.Manager):
         # Pass-through to the queryset method
         return self.get_queryset().get_month(year, month)
 
+    def in_month(self, year, month):
+        # Pass-through to the queryset method
+        return self.get_queryset().in_month(year, month)
+
     def get_date(self, day):
         # Pass-through to the queryset method
         return self.get_queryset().get_date(day)
 
+    def with_summary_counts(self):
+        return self.get_queryset().with_summary_counts()
+
     def get_current(self, raise_on_error=True):
         """
         Returns the current balance sheet for the current month if today is
@@ -156,13 +404,7 @@ class BalanceSheetManager(models.Manager):
         If the balance sheet doesn't exist or there are multiple balance sheets
         for the specified month, an exception is raised.
         """
-        today = date.today()
-
-        # TODO: change the day of month to be a setting
-        if today.day <= settings.BILLING_DAY_OF_MONTH:
-            month = today
-        else:
-            month = (today + relativedelta(months=1)).replace(day=1)
+        month = billing_month()
 
         try:
             return self.get_month(month.year, month.month)
@@ -196,6 +438,79 @@ class TransactionQuerySet(models.QuerySet):
         """
         return self.filter(debit__type__in=['Ca', 'Iv'])
 
+    def balance_entries(self):
+        """
+        Returns the signed amounts the transactions contribute to the ending balances
+        keyed by (sheet_id, account_id), computed with grouped aggregates rather than
+        by loading each transaction. Only pending transactions contribute.
+        """
+        pending = self.filter(complete=False).order_by()
+        entries = defaultdict(Decimal)
+
+        credits = pending.values("sheet_id", "credit_id").annotate(total=Sum("amount"))
+        for row in credits:
+            entries[(row["sheet_id"], row["credit_id"])] -= row["total"]
+
+        debits = pending.values("sheet_id", "debit_id").annotate(total=Sum("amount"))
+        for row in debits:
+            entries[(row["sheet_id"], row["debit_id"])] += row["total"]
+
+        return dict(entries)
+
+    def delete(self):
+        """
+        Deletes the transactions and reverses their contribution to the ending
+        balances of the credited and debited accounts in a single statement rather
+        than adjusting the balances once per deleted transaction.
+        """
+        Balance = apps.get_model("accounts", "Balance")
+
+        with transaction.atomic(using=self.db):
+            entries = self.balance_entries()
+            deleted = super().delete()
+
+            reverse = {key: -amount for key, amount in entries.items()}
+            if not mark_dirty(reverse):
+                Balance.objects.using(self.db).adjust_ending(reverse)
+
+        return deleted
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Creates the transactions without sending signals, then recomputes the
+        balances of the credited and debited accounts once each (or when the
+        bulk_mode block exits) rather than once per transaction.
+        """
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self._recompute_bulk(self._balance_keys(objs))
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """
+        Updates the transactions without sending signals. If a field that affects the
+        ending balances changed, the balances the transactions contributed to both
+        before and after the update are recomputed once each.
+        """
+        if not TRANSACTION_BALANCE_FIELDS.intersection(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        with transaction.atomic(using=self.db):
+            pks = [obj.pk for obj in objs]
+            stored = self.model.objects.using(self.db).filter(pk__in=pks)
+            keys = set(stored.balance_entries())
+
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            self._recompute_bulk(keys | self._balance_keys(objs))
+        return rows
+
+    def _balance_keys(self, objs):
+        return {key for obj in objs for key in obj.balance_entries()}
+
+    def _recompute_bulk(self, keys):
+        if not mark_dirty(keys):
+            recompute_balances(keys, using=self.db)
+
 
 class TransactionManager(models.Manager):
 
@@ -210,3 +525,58 @@ class TransactionManager(models.Manager):
 
     def transfers(self):
         return self.get_queryset().transfers()
+
+
+##########################################################################
+## Credit Score Manager
+##########################################################################
+
+class CreditScoreQuerySet(models.QuerySet):
+
+    def with_trend(self):
+        """
+        Annotates each score with the previous score from the same source, ordered
+        by date and then id, as prev_score (None for the first score of a source).
+        Filters applied before the annotation limit the scores the window can see;
+        slicing does not, so use preferred_with_trend rather than filtering preferred.
+        """
+        return self.annotate(prev_score=Window(
+            expression=Lag("score"), partition_by=[F("source")],
+            order_by=[F("date").asc(), F("id").asc()],
+        ))
+
+    def preferred_with_trend(self):
+        """
+        Returns the preferred scores annotated as with_trend, but with the previous
+        score found among all of the scores of the source. Filtering on a window
+        annotation applies the filter after the windows are computed.
+        """
+        return self.with_trend().annotate(is_preferred=Window(
+            expression=FirstValue("preferred"), partition_by=[F("id")],
+        )).filter(is_preferred=True)
+
+    def latest_preferred(self):
+        """
+        Returns the latest preferred score annotated with the previous score from
+        its source, whether or not that score is preferred, raising DoesNotExist if
+        there are no preferred scores.
+        """
+        latest = self.preferred_with_trend().order_by("-date", "-id").first()
+        if latest is None:
+            raise self.model.DoesNotExist("no preferred credit scores")
+        return latest
+
+
+class CreditScoreManager(models.Manager):
+
+    def get_queryset(self):
+        return CreditScoreQuerySet(self.model, using=self._db)
+
+    def with_trend(self):
+        return self.get_queryset().with_trend()
+
+    def preferred_with_trend(self):
+        return self.get_queryset().preferred_with_trend()
+
+    def latest_preferred(self):
+        return self.get_queryset().latest_preferred()
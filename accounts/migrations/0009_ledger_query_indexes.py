@@ -0,0 +1,52 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_alter_account_id_alter_balance_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="balancesheet",
+            index=models.Index(fields=["date"], name="balance_sheets_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["sheet", "credit", "complete"],
+                include=("amount",),
+                name="transactions_sheet_credit_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["sheet", "debit", "complete"],
+                include=("amount",),
+                name="transactions_sheet_debit_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["debit", "credit"], name="transactions_debit_credit_idx"
+            ),
+        ),
+        # The sheet index is redundant with the composite indexes above
+        migrations.AlterField(
+            model_name="transaction",
+            name="sheet",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="The balance sheet for the associated transaction",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="transactions",
+                to="accounts.balancesheet",
+            ),
+        ),
+    ]
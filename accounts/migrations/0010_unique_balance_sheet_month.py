@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:43
+
+import accounts.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_ledger_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="balancesheet",
+            constraint=models.UniqueConstraint(
+                accounts.utils.MonthStart("date"),
+                name="balance_sheets_unique_month",
+                violation_error_message="a balance sheet already exists for the month",
+            ),
+        ),
+    ]
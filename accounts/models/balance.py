@@ -16,10 +16,16 @@ Balance sheet related models.
 
 from datetime import date
 from decimal import Decimal
+from collections import defaultdict
+from dateutil.relativedelta import relativedelta
 
-from django.db import models
+from django.db import models, IntegrityError
 from django.urls import reverse
 
+from .payments import Payment
+from ..utils import MonthStart
+from ..balances import bulk_mode
+from ..managers import TRANSACTION_TOTALS
 from ..managers import TransactionManager
 from ..managers import BalanceSheetManager
 from ..managers import AccountBalanceTypeManager
@@ -63,6 +69,15 @@ class BalanceSheet(models.Model):
         db_table = "balance_sheets"
         ordering = ("-date",)
         get_latest_by = "date"
+        indexes = [
+            models.Index(fields=["date"], name="balance_sheets_date_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                MonthStart("date"), name="balance_sheets_unique_month",
+                violation_error_message="a balance sheet already exists for the month",
+            ),
+        ]
 
     # Balance sheet manager
     objects = BalanceSheetManager()
@@ -106,6 +121,64 @@ class BalanceSheet(models.Model):
         model = self.__class__
         return model.objects.filter(date__lt=self.date).order_by('-date').first()
 
+    def recompute_balances(self):
+        """
+        Recomputes the ending balance of every account on the sheet from its pending
+        transactions in a single statement. Ending balances are kept up to date as
+        transactions are saved and deleted, so this is only required when balances
+        or transactions have been modified without the ORM signals (e.g. by a
+        queryset update or directly in the database).
+
+        Returns the number of ending balances that were changed.
+        """
+        return self.balances.recompute_ending()
+
+    def roll_forward(self, date=None):
+        """
+        Creates the balance sheet for the next month (or the specified date) in a
+        single database transaction. The ending balance of every active account on
+        this sheet is carried forward as its beginning balance on the new sheet and
+        a pending transaction is created for every active payment that is due in
+        the new month. Balances and transactions are inserted in bulk and the ending
+        balances computed once, rather than sending signals for every row.
+
+        Returns the new balance sheet; raises a ValueError if a balance sheet
+        already exists for the month.
+        """
+        model = self.__class__
+        if date is None:
+            date = self.date + relativedelta(months=1)
+
+        with bulk_mode():
+            try:
+                sheet = model.objects.create(date=date)
+            except IntegrityError as e:
+                raise ValueError(
+                    "a balance sheet already exists for {}".format(date.strftime("%b %Y"))
+                ) from e
+
+            self.balances.filter(account__active=True).carry_forward(sheet)
+
+            transactions = []
+            payments = Payment.objects.filter(active=True).select_related(
+                "credit__bank", "debit__bank"
+            )
+
+            for payment in payments:
+                # Payments without a next date (e.g. infrequent payments) are skipped
+                if not payment.has_next_payment_date(after=date)[0]:
+                    continue
+
+                tx = Transaction.from_payment(payment, after=date)
+                if tx.date < date or tx.date >= date + relativedelta(months=1):
+                    continue
+
+                tx.sheet = sheet
+                transactions.append(tx)
+
+            Transaction.objects.bulk_create(transactions)
+        return sheet
+
     def __str__(self):
         return self.title
 
@@ -175,33 +248,114 @@ class Balance(models.Model):
         """
         return self.sheet.transactions.filter(debit=self.account)
 
+    def account_transactions(self):
+        """
+        Returns the transactions on the sheet that credit or debit the account, with
+        the accounts and banks of both sides selected, as a list that is fetched once
+        and cached on the balance. Once loaded, the credit and debit transactions and
+        the transaction totals are computed from this list rather than queried.
+        """
+        if not hasattr(self, "_account_transactions"):
+            account = self.account_id
+            query = Transaction.objects.filter(sheet_id=self.sheet_id).filter(
+                models.Q(credit_id=account) | models.Q(debit_id=account)
+            )
+            self._account_transactions = list(
+                query.select_related("credit__bank", "debit__bank")
+            )
+        return self._account_transactions
+
+    def credit_transactions(self):
+        """
+        Returns the loaded transactions that credit the account on the sheet.
+        """
+        return [
+            tx for tx in self.account_transactions()
+            if tx.credit_id == self.account_id
+        ]
+
+    def debit_transactions(self):
+        """
+        Returns the loaded transactions that debit the account on the sheet.
+        """
+        return [
+            tx for tx in self.account_transactions()
+            if tx.debit_id == self.account_id
+        ]
+
     def update_ending_balance(self):
         """
         (Re)computes the ending balance based on all associated transactions.
         Note, that this method does not save the ending balance, just sets it.
         """
-        total = self.beginning
-        total += self.credit_amount(completed=False)  # will be negative
-        total += self.debit_amount(completed=False)   # will be positive
+        totals = self._aggregate_transaction_totals()
+        total = self._meta.get_field("beginning").to_python(self.beginning)
+        total += totals["credits_pending"]  # will be negative
+        total += totals["debits_pending"]   # will be positive
         self.ending = total
 
+    def transaction_totals(self):
+        """
+        Returns the credit and debit totals of the transactions for the account on
+        the sheet, split by pending and completed transactions, computed in a single
+        query. Credit totals are negative and debit totals are positive. If the
+        balance was fetched using the with_transaction_totals queryset method or
+        the account transactions have been loaded then the totals are returned
+        without a query.
+        """
+        if all(hasattr(self, key) for key in TRANSACTION_TOTALS):
+            return {key: getattr(self, key) for key in TRANSACTION_TOTALS}
+
+        if hasattr(self, "_account_transactions"):
+            totals = {key: Decimal(0) for key in TRANSACTION_TOTALS}
+            for tx in self._account_transactions:
+                status = "completed" if tx.complete else "pending"
+                if tx.credit_id == self.account_id:
+                    totals[f"credits_{status}"] -= tx.amount
+                if tx.debit_id == self.account_id:
+                    totals[f"debits_{status}"] += tx.amount
+            return totals
+
+        return self._aggregate_transaction_totals()
+
     def credit_amount(self, completed=False):
         # NOTE: must return negative value
-        query = self.credits().filter(complete=completed)
-        return -1 * self._total_amount(query)
+        key = "credits_completed" if completed else "credits_pending"
+        return self.transaction_totals()[key]
 
     def debit_amount(self, completed=False):
         # NOTE: must return positive value
-        query = self.debits().filter(complete=completed)
-        return self._total_amount(query)
+        key = "debits_completed" if completed else "debits_pending"
+        return self.transaction_totals()[key]
 
-    def _total_amount(self, query):
+    def _aggregate_transaction_totals(self):
+        """
+        Sums the credits and debits for the account on the sheet by completion and
+        returns Decimal values for the totals. CANNOT return either None or float
+        types!
         """
-        Sums the amount for the given query and returns a Decimal value for
-        the total. CANNOT return either None or float types!
+        totals = {key: Decimal(0) for key in TRANSACTION_TOTALS}
+        for row in self._transaction_totals_query():
+            status = "completed" if row["complete"] else "pending"
+            if row["side"] == "credit_id":
+                totals[f"credits_{status}"] -= row["total"]
+            else:
+                totals[f"debits_{status}"] += row["total"]
+        return totals
+
+    def _transaction_totals_query(self):
         """
-        query = query.values("amount").aggregate(total=models.Sum("amount"))
-        return query["total"] or Decimal(0.0)
+        Returns the query that sums the credits and the debits of the account on the
+        sheet grouped by completion, one branch per side (rather than an OR of the
+        sides) so that each is an index only scan of the sheet and account index.
+        """
+        sides = [
+            Transaction.objects.filter(sheet_id=self.sheet_id, **{side: self.account_id})
+            .order_by().values("complete")
+            .annotate(side=models.Value(side), total=models.Sum("amount"))
+            for side in ("credit_id", "debit_id")
+        ]
+        return sides[0].union(sides[1], all=True)
 
     def prev_balance(self):
         """
@@ -247,7 +401,7 @@ class Transaction(models.Model):
 
     sheet = models.ForeignKey(
         'accounts.BalanceSheet', on_delete=models.CASCADE, null=False,
-        related_name='transactions',
+        related_name='transactions', db_index=False,
         help_text="The balance sheet for the associated transaction",
     )
     date = models.DateField(
@@ -281,14 +435,38 @@ class Transaction(models.Model):
         db_table = "transactions"
         ordering = ("-date",)
         get_latest_by = "date"
+        indexes = [
+            # Cover the credit and debit totals of an account on a sheet
+            models.Index(
+                fields=["sheet", "credit", "complete"], include=["amount"],
+                name="transactions_sheet_credit_idx",
+            ),
+            models.Index(
+                fields=["sheet", "debit", "complete"], include=["amount"],
+                name="transactions_sheet_debit_idx",
+            ),
+            # Transactions between two accounts, e.g. for a payment
+            models.Index(fields=["debit", "credit"], name="transactions_debit_credit_idx"),
+        ]
 
     # Transaction manager
     objects = TransactionManager()
 
     @classmethod
-    def from_payment(klass, payment):
+    def from_db(klass, db, field_names, values):
+        """
+        Remembers the sheet the transaction was loaded from, so that bulk mode can
+        record the sheets a save touches without fetching the stored transaction.
+        """
+        instance = super(Transaction, klass).from_db(db, field_names, values)
+        instance._loaded_sheet_id = instance.__dict__.get("sheet_id")
+        return instance
+
+    @classmethod
+    def from_payment(klass, payment, after=None):
         """
-        Creates a transaction instance from a payment instance
+        Creates a transaction instance from a payment instance, dated the next
+        payment date after the specified date (today by default) if there is one.
         """
         # Create the base transaction
         tx = klass(credit=payment.credit, debit=payment.debit, memo=str(payment))
@@ -298,9 +476,9 @@ class Transaction(models.Model):
             tx.amount = payment.amount
 
         # Modify the date if needed
-        has_tx_date, _ = payment.has_next_payment_date()
+        has_tx_date, _ = payment.has_next_payment_date(after=after)
         if has_tx_date:
-            tx.date = payment.next_payment_date()
+            tx.date = payment.next_payment_date(after=after)
 
         return tx
 
@@ -311,6 +489,51 @@ class Transaction(models.Model):
         }
         return reverse("sheets-api:sheet-transactions-detail", kwargs=kwargs)
 
+    def balance_entries(self):
+        """
+        Returns the signed amounts the transaction contributes to the ending
+        balances on its sheet as a dictionary keyed by (sheet_id, account_id).
+        The credited account is reduced by the amount and the debited account is
+        increased by it; completed transactions are already included in the
+        beginning balance so they contribute nothing.
+        """
+        if self.complete:
+            return {}
+
+        amount = self._meta.get_field("amount").to_python(self.amount)
+        entries = defaultdict(Decimal)
+        entries[(self.sheet_id, self.credit_id)] -= amount
+        entries[(self.sheet_id, self.debit_id)] += amount
+        return dict(entries)
+
+    def stored_balance_entries(self):
+        """
+        Returns the balance entries of the transaction as it is currently stored in
+        the database, or an empty dict if the transaction has not been saved.
+        """
+        if self.pk is None:
+            return {}
+
+        model = self.__class__
+        query = model.objects.only("sheet", "credit", "debit", "amount", "complete")
+
+        try:
+            return query.get(pk=self.pk).balance_entries()
+        except model.DoesNotExist:
+            return {}
+
+    def balance_deltas(self, previous):
+        """
+        Returns the change from the previous balance entries (e.g. those stored
+        before the transaction was saved) to the current balance entries. Changing
+        the credit or debit account or the sheet of the transaction moves its
+        amount from one ending balance to another, so both keys are returned.
+        """
+        deltas = self.balance_entries()
+        for key, amount in previous.items():
+            deltas[key] = deltas.get(key, Decimal(0)) - amount
+        return {key: delta for key, delta in deltas.items() if delta}
+
     def __str__(self):
         return "Transfer ${:,} from {} to {} on {}".format(
             self.amount, self.credit, self.debit, self.date
@@ -17,6 +17,8 @@ Credit Score tracking model.
 from datetime import date
 from django.db import models
 
+from ..managers import CreditScoreManager
+
 
 __all__ = [
     "CreditScore",
@@ -77,6 +79,8 @@ class CreditScore(models.Model):
         ordering = ("-date",)
         get_latest_by = "date"
 
+    objects = CreditScoreManager()
+
     def __str__(self):
         return "{} by {} on {}".format(
             self.score, self.source, self.date
@@ -114,16 +118,42 @@ class CreditScore(models.Model):
         """
         return (float(self.score) / 850.0) * 100
 
+    def previous_score(self):
+        """
+        Returns the previous score from the same source or None if there is no
+        previous score, using the prev_score annotation of with_trend if available.
+        """
+        if hasattr(self, "prev_score"):
+            return self.prev_score
+
+        # Scores on the same date are ordered by id, the same as with_trend
+        earlier = models.Q(date__lt=self.date)
+        if self.pk is not None:
+            earlier |= models.Q(date=self.date, id__lt=self.pk)
+
+        model = self.__class__
+        prev = model.objects.filter(earlier, source=self.source).order_by("-date", "-id").first()
+        return prev.score if prev is not None else None
+
     def trend(self):
         """
         Returns the trend -- "up", "down", or "flat" based on the previous score. If
         there is no previous score, then "flat" is returned.
         """
-        model = self.__class__
-        prev = model.objects.filter(source=self.source, date__lt=self.date).first()
-        if model is None or prev.score == self.score:
+        prev = self.previous_score()
+        if prev is None or prev == self.score:
             return FLAT
 
-        if self.score > prev.score:
+        if self.score > prev:
             return UP
         return DOWN
+
+    def delta(self):
+        """
+        Returns the change in score from the previous score from the same source or
+        None if there is no previous score.
+        """
+        prev = self.previous_score()
+        if prev is None:
+            return None
+        return self.score - prev
@@ -20,11 +20,18 @@ from .models import Account, Company, Payment
 from .models import BalanceSheet, Balance, Transaction
 
 from decimal import Decimal
+from urllib.parse import urlparse
 from django.db.models import Count
+from django.db import transaction, IntegrityError
+from django.urls import resolve, get_script_prefix, Resolver404
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
 
+# Account type display names by type code
+ACCOUNT_TYPE_NAMES = dict(Account.ACCOUNT_TYPES)
+
+
 ##########################################################################
 ## Account Serializers
 ##########################################################################
@@ -67,6 +74,72 @@ class AccountNameSerializer(serializers.HyperlinkedModelSerializer):
         return str(obj)
 
 
+class AccountRelatedField(serializers.HyperlinkedRelatedField):
+    """
+    Resolves account hyperlinks using the accounts that a batch serializer has
+    loaded into the serializer context (if any) rather than with a query per link.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("view_name", "api:accounts-detail")
+        kwargs.setdefault("queryset", Account.objects.all())
+        super(AccountRelatedField, self).__init__(**kwargs)
+
+    def get_object(self, view_name, view_args, view_kwargs):
+        accounts = self.context.get("accounts")
+        if accounts is None:
+            return super(AccountRelatedField, self).get_object(
+                view_name, view_args, view_kwargs
+            )
+
+        try:
+            return accounts[int(view_kwargs[self.lookup_url_kwarg])]
+        except KeyError:
+            raise Account.DoesNotExist("account not found")
+
+
+class AccountBatchSerializer(serializers.ListSerializer):
+    """
+    Validates a list of objects that link to accounts, loading all of the accounts
+    linked by the account_fields of every object with a single query.
+    """
+
+    account_fields = ()
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            pks = self.get_account_pks(data)
+            self._context["accounts"] = Account.objects.in_bulk(pks)
+        return super(AccountBatchSerializer, self).to_internal_value(data)
+
+    def get_account_pks(self, data):
+        """
+        Returns the primary keys of the accounts linked by the objects; links
+        that cannot be resolved are left for the account field to report.
+        """
+        pks = set()
+        prefix = get_script_prefix()
+
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+
+            for field in self.account_fields:
+                value = item.get(field)
+                if not isinstance(value, str):
+                    continue
+
+                path = urlparse(value).path
+                if path.startswith(prefix):
+                    path = "/" + path[len(prefix):]
+
+                try:
+                    pks.add(int(resolve(path).kwargs["pk"]))
+                except (Resolver404, KeyError, TypeError, ValueError):
+                    continue
+        return pks
+
+
 ##########################################################################
 ## Payments Serializers
 ##########################################################################
@@ -95,15 +168,8 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 class TransactionSerializer(serializers.ModelSerializer):
 
-    credit = serializers.HyperlinkedRelatedField(
-        view_name="api:accounts-detail",
-        queryset=Account.objects.all()
-    )
-
-    debit = serializers.HyperlinkedRelatedField(
-        view_name="api:accounts-detail",
-        queryset=Account.objects.all()
-    )
+    credit = AccountRelatedField()
+    debit = AccountRelatedField()
 
     class Meta:
         model = Transaction
@@ -121,6 +187,27 @@ class TransactionSerializer(serializers.ModelSerializer):
         return super(TransactionSerializer, self).create(validated_data)
 
 
+class TransactionBatchSerializer(AccountBatchSerializer):
+    """
+    Validates a list of transactions, loading all of the credited and debited
+    accounts with one query rather than two queries per transaction.
+    """
+
+    account_fields = ("credit", "debit")
+
+    def create(self, validated_data):
+        """
+        Inserts the transactions with a single bulk create; the ending balances of
+        the affected accounts are recomputed once rather than once per transaction.
+        """
+        if any("sheet" not in item for item in validated_data):
+            raise KeyError("view must specify the sheet associated with the transactions")
+
+        return Transaction.objects.bulk_create([
+            Transaction(**item) for item in validated_data
+        ])
+
+
 class TransactionSummarySerializer(TransactionSerializer):
 
     credit = AccountNameSerializer()
@@ -178,6 +265,32 @@ class BalanceSerializer(serializers.ModelSerializer):
         return super(BalanceSerializer, self).create(validated_data)
 
 
+class BalanceBatchSerializer(AccountBatchSerializer):
+    """
+    Validates a list of beginning balances, loading the accounts in one query.
+    """
+
+    account_fields = ("account",)
+
+
+class BalanceBeginningSerializer(serializers.Serializer):
+    """
+    Identifies a balance on a sheet by its id or account to set its beginning balance.
+    """
+
+    id = serializers.IntegerField(required=False)
+    account = AccountRelatedField(required=False)
+    beginning = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        list_serializer_class = BalanceBatchSerializer
+
+    def validate(self, data):
+        if ("id" in data) == ("account" in data):
+            raise ValidationError("specify either the balance id or account, not both")
+        return data
+
+
 class BalanceSummarySerializer(BalanceSerializer):
 
     account = AccountNameSerializer()
@@ -190,8 +303,8 @@ class BalanceSummarySerializer(BalanceSerializer):
 class BalanceDetailSerializer(BalanceSerializer):
 
     account = AccountNameSerializer()
-    credits = CreditTransactionSerializer(many=True)
-    debits = DebitTransactionSerializer(many=True)
+    credits = CreditTransactionSerializer(many=True, source="credit_transactions")
+    debits = DebitTransactionSerializer(many=True, source="debit_transactions")
     credit_amount = serializers.SerializerMethodField()
     debit_amount = serializers.SerializerMethodField()
     credit_completed_amount = serializers.SerializerMethodField()
@@ -206,17 +319,22 @@ class BalanceDetailSerializer(BalanceSerializer):
             "credit_completed_amount", "debit_completed_amount",
         )
 
+    def to_representation(self, instance):
+        # Load the transactions for the account once for the lists and totals
+        instance.account_transactions()
+        return super(BalanceDetailSerializer, self).to_representation(instance)
+
     def get_credit_amount(self, obj):
-        return obj.credit_amount(completed=False)
+        return obj.transaction_totals()["credits_pending"]
 
     def get_credit_completed_amount(self, obj):
-        return obj.credit_amount(completed=True)
+        return obj.transaction_totals()["credits_completed"]
 
     def get_debit_amount(self, obj):
-        return obj.debit_amount(completed=False)
+        return obj.transaction_totals()["debits_pending"]
 
     def get_debit_completed_amount(self, obj):
-        return obj.debit_amount(completed=True)
+        return obj.transaction_totals()["debits_completed"]
 
     def get_currency(self, obj):
         return Currency[obj.account.currency].symbol
@@ -237,33 +355,31 @@ class BalanceSheetSerializer(serializers.HyperlinkedModelSerializer):
             "memo": {"required": False, "default": None},
         }
 
-    def _sheet_exists_for_month(self, date):
-        qs = BalanceSheet.objects.filter(date__year=date.year, date__month=date.month)
-        return qs.count() > 0
-
     def create(self, data):
         """
-        Ensure that a sheet is unique for month/year before create
+        Ensure that a sheet is unique for month/year (enforced by the database)
         """
-        if self._sheet_exists_for_month(data['date']):
+        try:
+            with transaction.atomic():
+                return super(BalanceSheetSerializer, self).create(data)
+        except IntegrityError:
             detail = "a balance sheet already exists for {}".format(
                 data['date'].strftime("%b %Y")
             )
             raise ValidationError(detail=detail)
-        return super(BalanceSheetSerializer, self).create(data)
 
     def update(self, instance, data):
         """
-        Ensure sheet is unique for month/year before update
+        Ensure sheet is unique for month/year (enforced by the database)
         """
-        date = data['date']
-        if instance.date.year != date.year or instance.date.month != date.month:
-            if self._sheet_exists_for_month(date):
-                detail = "cannot update sheet, a sheet already exists for {}".format(
-                    date.strftime("%b %Y")
-                )
-                raise ValidationError(detail=detail)
-        return super(BalanceSheetSerializer, self).update(instance, data)
+        try:
+            with transaction.atomic():
+                return super(BalanceSheetSerializer, self).update(instance, data)
+        except IntegrityError:
+            detail = "cannot update sheet, a sheet already exists for {}".format(
+                data['date'].strftime("%b %Y")
+            )
+            raise ValidationError(detail=detail)
 
 
 class BalanceSheetSummarySerializer(BalanceSheetSerializer):
@@ -281,18 +397,27 @@ class BalanceSheetSummarySerializer(BalanceSheetSerializer):
         )
 
     def get_num_accounts(self, obj):
-        # NOTE: the order_by is required or this won't group account types
-        data = obj.accounts.values('type').annotate(count=Count('type')).order_by()
+        # Use the counts annotated by with_summary_counts if available
+        if hasattr(obj, "num_transactions"):
+            counts = {
+                code: getattr(obj, f"num_accounts_{code}")
+                for code in ACCOUNT_TYPE_NAMES
+            }
+        else:
+            # NOTE: the order_by is required or this won't group account types
+            data = obj.accounts.values('type').annotate(count=Count('type')).order_by()
+            counts = {item["type"]: item["count"] for item in data}
 
         # Flatten the data into a type:count dictionary
-        # TODO: this is probably poor performance to create the dict every time
-        types = dict(Account.ACCOUNT_TYPES)
         return {
-            types[item["type"]]: item["count"]
-            for item in data
+            ACCOUNT_TYPE_NAMES[code]: count
+            for code, count in counts.items()
+            if count > 0
         }
 
     def get_num_transactions(self, obj):
+        if hasattr(obj, "num_transactions"):
+            return obj.num_transactions
         return obj.transactions.count()
 
 
@@ -314,9 +439,12 @@ class BalanceSheetDetailSerializer(BalanceSheetSerializer):
 
 class CreditScoreSerializer(serializers.HyperlinkedModelSerializer):
 
+    trend = serializers.CharField(read_only=True)
+    delta = serializers.IntegerField(read_only=True, allow_null=True)
+
     class Meta:
         model = CreditScore
-        fields = ("url", "date", "score", "source")
+        fields = ("url", "date", "score", "source", "trend", "delta")
         extra_kwargs = {
             "url": {"view_name": "api:creditscores-detail"}
         }
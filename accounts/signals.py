@@ -17,9 +17,13 @@ Signals used by accounts models - imported by the apps.py configuration.
 from .models import Balance
 from .models import Transaction
 from .models import BalanceSheet
+from .balances import mark_dirty, bulk_sheets
+from .cache import invalidate_current_sheet
 
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models.signals import pre_save, post_save
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
 
 
 @receiver(pre_save, sender=BalanceSheet, dispatch_uid="balance_sheet_unique_for_month_title")
@@ -35,35 +39,89 @@ def update_balance_sheet_title(sender, instance, *args, **kwargs):
         )
 
 
+@receiver(post_save, sender=BalanceSheet, dispatch_uid="invalidate_current_sheet_on_save")
+@receiver(post_delete, sender=BalanceSheet, dispatch_uid="invalidate_current_sheet_on_delete")
+def invalidate_current_sheet_cache(sender, instance, *args, **kwargs):
+    """
+    Invalidates the cached current sheet when a balance sheet is saved or deleted,
+    and again on commit so that other processes do not cache uncommitted state.
+    """
+    invalidate_current_sheet()
+    transaction.on_commit(invalidate_current_sheet)
+
+
+@receiver(pre_save, sender=Transaction, dispatch_uid="store_balance_entries_before_transaction")
+def store_balance_entries(sender, instance, *args, raw=False, **kwargs):
+    """
+    Fetches the balance entries of the transaction as they are currently stored so
+    that only the difference has to be applied to the ending balances after save.
+    """
+    instance._stored_balance_entries = {}
+    if raw:
+        return
+
+    # In bulk mode the whole sheet is recomputed, so only the sheets are recorded;
+    # the stored transaction is only fetched if it was not loaded from the database
+    if bulk_sheets() is not None:
+        loaded = getattr(instance, "_loaded_sheet_id", None)
+        if instance.pk is None or loaded is not None:
+            sheets = {instance.sheet_id, loaded} - {None}
+            mark_dirty({(sheet_id, None) for sheet_id in sheets})
+            return
+
+    instance._stored_balance_entries = instance.stored_balance_entries()
+
+
 @receiver(post_save, sender=Transaction, dispatch_uid="update_ending_balance_after_transaction")
-def update_balance_after_transaction(sender, instance, *args, **kwargs):
+def update_balance_after_transaction(sender, instance, *args, raw=False, **kwargs):
     """
-    Recomputes the ending balance for the accounts credited and debited on the
-    transaction, saving their new values back to disk.
+    Applies the change in the transaction amount to the ending balances of the
+    accounts credited and debited (both before and after the save) so that the
+    cost of saving a transaction does not grow with the transactions on the sheet.
     """
-    for account in (instance.credit, instance.debit):
-        try:
-            balance = instance.sheet.balances.get(account=account)
-            balance.update_ending_balance()
-            balance.save()
-        except Balance.DoesNotExist:
-            continue
+    # Fixtures store their own ending balances, load them in bulk_mode to recompute
+    if raw and bulk_sheets() is None:
+        return
 
+    previous = getattr(instance, "_stored_balance_entries", {})
+    deltas = instance.balance_deltas(previous)
 
-@receiver(pre_save, sender=Balance, dispatch_uid="update_ending_balance_on_save")
-def update_ending_balance(sender, instance, *args, **kwargs):
+    # Deferred balances are recomputed when the database transaction commits
+    if not mark_dirty(deltas):
+        Balance.objects.adjust_ending(deltas)
+
+    # The transaction is now stored on its current sheet
+    instance._loaded_sheet_id = instance.sheet_id
+
+
+@receiver(post_delete, sender=Transaction, dispatch_uid="reverse_ending_balance_after_delete")
+def reverse_balance_after_delete(sender, instance, origin=None, *args, **kwargs):
     """
-    Updates the ending balance when the Balance is saved.
+    Reverses the contribution of a deleted transaction to the ending balances of the
+    accounts credited and debited on it.
     """
-    instance.update_ending_balance()
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+
+    # Transaction querysets reverse all of the deleted amounts in one statement
+    if isinstance(origin, QuerySet) and model is Transaction:
+        return
 
+    # The balances are deleted along with the sheet so there is nothing to reverse
+    if model is BalanceSheet:
+        return
 
-@receiver(post_save, sender=BalanceSheet, dispatch_uid="update_all_ending_balances_on_sheet")
-def update_all_ending_balances(sender, instance, *args, **kwargs):
+    reverse = {key: -amount for key, amount in instance.balance_entries().items()}
+    if not mark_dirty(reverse):
+        Balance.objects.adjust_ending(reverse)
+
+
+@receiver(pre_save, sender=Balance, dispatch_uid="update_ending_balance_on_save")
+def update_ending_balance(sender, instance, *args, raw=False, **kwargs):
     """
-    Updates all ending balances when the sheet is saved.
+    Updates the ending balance when the Balance is saved.
     """
-    # TODO: Remove this signal in favor of a manual method
-    for balance in instance.balances.all():
-        balance.update_ending_balance()
-        balance.save()
+    if raw and bulk_sheets() is None:
+        return
+
+    if not mark_dirty({(instance.sheet_id, instance.account_id)}):
+        instance.update_ending_balance()
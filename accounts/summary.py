@@ -0,0 +1,224 @@
+# accounts.summary
+# Summaries of balance sheets for the dashboard and balance sheet pages.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 17:12:08 2026 -0400
+#
+# ID: summary.py [] benjamin@bengfort.com $
+
+"""
+Summaries of balance sheets for the dashboard and balance sheet pages.
+
+The dashboard compares the beginning and ending balances of each type of account on
+the latest balance sheet with the previous sheet. Rather than aggregating a filtered
+queryset for every account type on every sheet, the totals for all of the sheets are
+computed with a single grouped query using conditional sums, and the results are
+returned as plain dictionaries that templates can render without further queries.
+
+Similarly, the balance sheet pages load the balances of a sheet once and group them
+by account type in Python, computing the count and totals of each group as they go,
+and load the transactions of the sheet once to summarize them in the same pass.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+from django.db.models import Q, Sum, Count, Min, Max
+
+from .models import Account, BalanceSheet, Balance, Transaction
+
+
+# Transactions that debit these types of accounts are transfers, not expenses
+TRANSFER_TYPES = {Account.CASH, Account.INVESTMENT}
+
+# The summary key of each account type
+ACCOUNT_TYPE_KEYS = {
+    Account.CASH: "cash",
+    Account.CREDIT: "credit",
+    Account.LOAN: "loan",
+    Account.INVESTMENT: "investment",
+    Account.INSURANCE: "insurance",
+    Account.BILLING: "billing",
+    Account.CHARITABLE: "charitable",
+}
+
+
+##########################################################################
+## Balance Groups
+##########################################################################
+
+class BalanceGroup(object):
+    """
+    The balances of one type of account on a sheet, which can be iterated over in
+    templates, along with their count and the sum of the beginning and ending
+    balances of the active, non-excluded accounts in the same form as the result of
+    BalanceQuerySet.totals, so that rendering the group does not query the database.
+    """
+
+    def __init__(self):
+        self.balances = []
+        self.totals = {"beginning__sum": None, "ending__sum": None}
+
+    def add(self, balance):
+        self.balances.append(balance)
+
+        account = balance.account
+        if account.active and not account.exclude:
+            for field in ("beginning", "ending"):
+                key = f"{field}__sum"
+                self.totals[key] = (self.totals[key] or 0) + getattr(balance, field)
+
+    @property
+    def count(self):
+        return len(self.balances)
+
+    def __iter__(self):
+        return iter(self.balances)
+
+    def __len__(self):
+        return len(self.balances)
+
+
+def balance_groups(sheet):
+    """
+    Returns a dictionary of account type key to the BalanceGroup of the balances of
+    that type on the sheet (every type has a group, even if it is empty), fetching
+    the balances along with their accounts and banks in one query.
+    """
+    groups = {key: BalanceGroup() for key in ACCOUNT_TYPE_KEYS.values()}
+    for balance in sheet.balances.select_related("account__bank"):
+        groups[ACCOUNT_TYPE_KEYS[balance.account.type]].add(balance)
+    return groups
+
+
+class TransactionSummary(object):
+    """
+    The transactions on a sheet, which can be iterated over in templates, along with
+    their count, date range, and the totals of the expenses and transfers (in the
+    same form as the result of TransactionQuerySet.total).
+    """
+
+    def __init__(self, transactions):
+        self.transactions = list(transactions)
+        self.expenses = {"amount__sum": None}
+        self.transfers = {"amount__sum": None}
+        self.earliest = None
+        self.latest = None
+
+        for transaction in self.transactions:
+            if transaction.debit.type in TRANSFER_TYPES:
+                total = self.transfers
+            else:
+                total = self.expenses
+            total["amount__sum"] = (total["amount__sum"] or 0) + transaction.amount
+
+            if self.earliest is None or transaction.date < self.earliest:
+                self.earliest = transaction.date
+            if self.latest is None or transaction.date > self.latest:
+                self.latest = transaction.date
+
+    @property
+    def count(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+    def __len__(self):
+        return len(self.transactions)
+
+
+def transaction_summary(sheet):
+    """
+    Returns the TransactionSummary of the transactions on the sheet, fetching the
+    transactions along with their credit and debit accounts and banks in one query.
+    """
+    return TransactionSummary(
+        sheet.transactions.select_related("credit__bank", "debit__bank")
+    )
+
+
+##########################################################################
+## Summaries
+##########################################################################
+
+def sheet_totals(sheets):
+    """
+    Returns a dictionary of sheet id to the totals of the balances on the sheet by
+    account type key, e.g. totals[sheet.id]["cash"] is a dictionary with the count
+    of cash account balances on the sheet and the sum of the beginning and ending
+    balances of the active, non-excluded cash accounts (None if there are none, the
+    same as BalanceQuerySet.totals). Every sheet is summarized in one query.
+    """
+    included = Q(account__active=True, account__exclude=False)
+
+    annotations = {}
+    for code, key in ACCOUNT_TYPE_KEYS.items():
+        kind = Q(account__type=code)
+        annotations[f"{key}_count"] = Count("id", filter=kind)
+        annotations[f"{key}_beginning"] = Sum("beginning", filter=kind & included)
+        annotations[f"{key}_ending"] = Sum("ending", filter=kind & included)
+
+    rows = (
+        Balance.objects.filter(sheet__in=sheets)
+        .order_by().values("sheet_id").annotate(**annotations)
+    )
+    rows = {row["sheet_id"]: row for row in rows}
+
+    totals = {}
+    for sheet in sheets:
+        row = rows.get(sheet.pk, {})
+        totals[sheet.pk] = {
+            key: {
+                "count": row.get(f"{key}_count", 0),
+                "beginning": row.get(f"{key}_beginning"),
+                "ending": row.get(f"{key}_ending"),
+            }
+            for key in ACCOUNT_TYPE_KEYS.values()
+        }
+    return totals
+
+
+def overview():
+    """
+    Returns the summary of the latest balance sheet for the overview dashboard: the
+    latest and previous sheets, the totals by account type of each (the previous
+    totals are None if there is no previous sheet), the number and date range of the
+    transactions on the latest sheet, and the monthly savings and investment
+    increase from the previous sheet. Returns None if there are no balance sheets.
+    """
+    sheets = list(BalanceSheet.objects.order_by("-date")[:2])
+    if not sheets:
+        return None
+
+    latest = sheets[0]
+    previous = sheets[1] if len(sheets) > 1 else None
+    totals = sheet_totals(sheets)
+
+    summary = {
+        "latest": latest,
+        "previous": previous,
+        "totals": totals[latest.pk],
+        "prev_totals": totals[previous.pk] if previous else None,
+        "transactions": Transaction.objects.filter(sheet=latest).aggregate(
+            count=Count("id"), earliest=Min("date"), latest=Max("date"),
+        ),
+        "monthly_savings": 0,
+        "investment_increase": 0,
+    }
+
+    if previous is not None:
+        current, prev = summary["totals"], summary["prev_totals"]
+
+        # Compute monthly savings
+        ccash, pcash = current["cash"]["ending"], prev["cash"]["ending"]
+        if ccash and pcash:
+            summary["monthly_savings"] = ccash - pcash
+
+        # Compute investment increase
+        cinvt, pinvt = current["investment"]["ending"], prev["investment"]["ending"]
+        if cinvt and pinvt:
+            summary["investment_increase"] = float(cinvt / pinvt) * 100
+
+    return summary
@@ -14,14 +14,10 @@ Accounting display related template tags and filters.
 ## Imports
 ##########################################################################
 
-from datetime import date
-from dateutil.relativedelta import relativedelta
-
 from django import template
-from django.conf import settings
 from django.utils.html import mark_safe
-from accounts.utils import Currency
-from accounts.models import BalanceSheet
+from accounts.utils import Currency, billing_month
+from accounts.cache import get_current_sheet
 
 
 # Register template tags
@@ -75,17 +71,12 @@ def transaction_credit(transaction):
 
 @register.inclusion_tag("snippets/next_sheet.html")
 def next_sheet():
-    # If today is after the 15th of the month, then next month is the first
-    # of the next month, if it is before, it is today's date.
-    today = date.today()
-    if today.day <= settings.BILLING_DAY_OF_MONTH:
-        next_month = today
-    else:
-        next_month = (today + relativedelta(months=1)).replace(day=1)
-
+    # If today is after the billing day of the month, then next month is the first
+    # of the next month, if it is before, it is today's date. The current sheet is
+    # cached between requests until a balance sheet is saved or deleted.
     return {
-        "latest": BalanceSheet.objects.get_current(raise_on_error=False),
-        "next_month": next_month,
+        "latest": get_current_sheet(),
+        "next_month": billing_month(),
     }
 
 
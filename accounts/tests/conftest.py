@@ -20,6 +20,10 @@ pytest fixtures and configuration for account tests
 import pytest
 
 from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from accounts.cache import invalidate_current_sheet
 
 from .factories import this_month
 from .factories import AccountFactory, CreditCardFactory
@@ -27,6 +31,15 @@ from .factories import BillingAccountFactory, CharitableAccountFactory
 from .factories import BalanceSheetFactory, BalanceFactory, TransactionFactory
 
 
+@pytest.fixture(autouse=True)
+def current_sheet_cache():
+    """
+    The cached current sheet is not invalidated when a test's database transaction
+    is rolled back, so it is cleared before each test.
+    """
+    invalidate_current_sheet()
+
+
 @pytest.fixture()
 def balance_sheet(db):
     sheet = BalanceSheetFactory.create()
@@ -57,3 +70,31 @@ def balance_sheet(db):
     TransactionFactory.create(sheet=sheet, date=this_month(1), credit=savings, debit=checking, amount=Decimal("750.61"))
 
     return sheet
+
+
+@pytest.fixture()
+def assert_constant_queries():
+    """
+    Returns a helper that fails if the number of queries to GET the url grows when
+    more rows are created (by calling create the specified number of times), e.g.
+    because the serializer fetches a related object for every row.
+    """
+    def check(client, url, create, rows=5):
+        with CaptureQueriesContext(connection) as queries:
+            rep = client.get(url)
+        assert rep.status_code == 200, f"could not get {url}"
+
+        for _ in range(rows):
+            create()
+
+        with CaptureQueriesContext(connection) as more_queries:
+            rep = client.get(url)
+        assert rep.status_code == 200, f"could not get {url}"
+
+        assert len(more_queries) == len(queries), (
+            f"GET {url} ran {len(queries)} queries before and {len(more_queries)} "
+            f"queries after creating {rows} more rows"
+        )
+        return rep
+
+    return check
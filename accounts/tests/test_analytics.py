@@ -0,0 +1,208 @@
+# accounts.tests.test_analytics
+# Tests for the time series of account balances.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 19:02:44 2026 -0400
+#
+# ID: test_analytics.py [] benjamin@bengfort.com $
+
+"""
+Tests for the time series of account balances.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import pytest
+
+from decimal import Decimal
+from django.urls import reverse
+from dateutil.relativedelta import relativedelta
+
+from accounts import analytics
+from accounts.models import Account, Balance
+from accounts.analytics import Series, TimeSeries
+
+from .factories import this_month, AccountFactory, CreditCardFactory
+from .factories import BalanceSheetFactory, BalanceFactory
+
+# All tests in this module use the database
+pytestmark = pytest.mark.django_db
+
+
+# Number of monthly balance sheets in the history
+MONTHS = 20
+
+
+@pytest.fixture()
+def history(db):
+    """
+    Monthly balance sheets with growing cash and investments and a credit card;
+    month 0 is the oldest sheet and the excluded account should never be counted.
+    """
+    cash = AccountFactory(name="History Checking")
+    excluded = AccountFactory(name="History Excluded", exclude=True)
+    credit = CreditCardFactory(name="History Card")
+    investment = AccountFactory(name="History Brokerage", type=Account.INVESTMENT)
+
+    sheets = []
+    for month in range(MONTHS):
+        sheet = BalanceSheetFactory(date=this_month() - relativedelta(months=MONTHS - month - 1))
+        balances = [
+            (cash, 1000 + 100 * month, 1050 + 100 * month),
+            (excluded, 99999, 99999),
+            (credit, -500 - month, -400),
+            (investment, 10000 + 1000 * month, 10000 + 1000 * month),
+        ]
+
+        for account, beginning, ending in balances:
+            balance = BalanceFactory(sheet=sheet, account=account, beginning=beginning)
+            Balance.objects.filter(pk=balance.pk).update(ending=ending)
+        sheets.append(sheet)
+
+    return sheets
+
+
+def month(rows, n):
+    """
+    Returns the row for month n (where 0 is the oldest sheet in the history).
+    """
+    return rows[MONTHS - n - 1]
+
+
+##########################################################################
+## Series Tests
+##########################################################################
+
+@pytest.mark.parametrize("kwargs", [
+    {"metric": "median"},
+    {"comparison": "ratio"},
+    {"types": ()},
+])
+def test_series_validation(kwargs):
+    params = {"name": "bad", "types": Account.CASH}
+    params.update(kwargs)
+
+    with pytest.raises(ValueError):
+        Series(**params)
+
+
+@pytest.mark.parametrize("series,window", [
+    ([], 12),
+    ([Series("date", Account.CASH)], 12),
+    ([Series("ending", Account.CASH)], 12),
+    ([Series("cash", Account.CASH), Series("cash", Account.CREDIT)], 12),
+    ([Series("cash", Account.CASH)], 0),
+])
+def test_time_series_validation(series, window):
+    with pytest.raises(ValueError):
+        TimeSeries(series, window=window)
+
+
+def test_metrics(history, django_assert_num_queries):
+    """
+    Every metric of every series is computed in a single query
+    """
+    series = TimeSeries([
+        Series("cash_beginning", Account.CASH, metric=analytics.BEGINNING),
+        Series("cash_ending", Account.CASH, metric=analytics.ENDING),
+        Series("cash_change", Account.CASH, metric=analytics.CHANGE),
+        Series("ratio", Account.CREDIT, metric=analytics.RATIO),
+        Series("net", (Account.CASH, Account.CREDIT), metric=analytics.ENDING),
+    ], window=None)
+
+    with django_assert_num_queries(1):
+        rows = series.results()
+
+    assert len(rows) == MONTHS
+    assert [row["date"] for row in rows] == sorted((s.date for s in history), reverse=True)
+
+    row = month(rows, 3)
+    assert row == {
+        "date": history[3].date,
+        "cash_beginning": Decimal("1300.00"),
+        "cash_ending": Decimal("1350.00"),
+        "cash_change": Decimal("50.00"),
+        "ratio": pytest.approx(400 / 503 * 100),
+        "net": Decimal("950.00"),
+    }
+
+
+def test_comparisons(history):
+    """
+    Comparisons are made with the previous sheet, even for the oldest row in window
+    """
+    rows = TimeSeries([
+        Series("investment", Account.INVESTMENT),
+        Series("growth", Account.INVESTMENT, comparison=analytics.DIFFERENCE),
+        Series("percent", Account.INVESTMENT, comparison=analytics.PERCENT),
+    ], window=5).results()
+
+    assert len(rows) == 5
+    assert rows[0]["date"] == history[-1].date
+
+    for row in rows:
+        assert row["growth"] == Decimal("1000.00")
+
+    oldest = rows[-1]
+    assert oldest["investment"] == Decimal("25000.00")
+    assert oldest["percent"] == pytest.approx(25000 / 24000 * 100)
+
+
+def test_first_sheet_comparison(history):
+    """
+    The first sheet has nothing to compare with
+    """
+    rows = TimeSeries([
+        Series("savings", Account.CASH, comparison=analytics.DIFFERENCE),
+        Series("percent", Account.CASH, comparison=analytics.PERCENT),
+    ], window=None).results()
+
+    assert month(rows, 0)["savings"] is None
+    assert month(rows, 0)["percent"] is None
+    assert month(rows, 1)["savings"] == Decimal("100.00")
+
+
+##########################################################################
+## Preset Endpoint Tests
+##########################################################################
+
+@pytest.mark.parametrize("endpoint,window,columns", [
+    ("api:cashflow-list", 6, {
+        "date", "cash_beginning", "debt_beginning", "cash_ending", "debt_ending",
+        "cash_change", "debt_change", "net_beginning", "net_ending", "net_change",
+    }),
+    ("api:savings-list", 12, {"date", "ending_cash", "savings"}),
+    ("api:investments-list", 18, {"date", "investment", "percent_change"}),
+])
+def test_presets(admin_client, history, endpoint, window, columns, django_assert_num_queries):
+    # Session, user, and the time series
+    with django_assert_num_queries(3):
+        rep = admin_client.get(reverse(endpoint))
+    assert rep.status_code == 200
+
+    data = rep.json()
+    assert len(data) == window
+    assert data[0]["date"] == history[-1].date.isoformat()
+    for row in data:
+        assert set(row) == columns
+
+
+def test_cashflow_preset(admin_client, history):
+    row = admin_client.get(reverse("api:cashflow-list")).json()[0]
+    assert row["cash_ending"] == 2950.0
+    assert row["debt_ending"] == -400.0
+    assert row["net_ending"] == 2550.0
+    assert row["net_change"] == row["cash_change"] + row["debt_change"]
+
+
+def test_savings_preset(admin_client, history):
+    data = admin_client.get(reverse("api:savings-list")).json()
+    assert all(row["savings"] == 100.0 for row in data)
+
+
+def test_investments_preset(admin_client, history):
+    data = admin_client.get(reverse("api:investments-list")).json()
+    assert data[0]["investment"] == 29000.0
+    assert data[0]["percent_change"] == pytest.approx(29000 / 28000 * 100)
@@ -0,0 +1,273 @@
+# accounts.tests.test_balances
+# Tests for deferred and batched ending balance maintenance.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 11:02:17 2026 -0400
+#
+# ID: test_balances.py [] benjamin@bengfort.com $
+
+"""
+Tests for deferred and batched ending balance maintenance.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import pytest
+
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Balance, BalanceSheet, Transaction
+from accounts.balances import bulk_mode, bulk_sheets
+from accounts.balances import deferred_balances, dirty_balances
+
+# All tests in this module use the database
+pytestmark = pytest.mark.django_db
+
+
+def ending(sheet, name):
+    return sheet.balances.get(account__name=name).ending
+
+
+def balance_updates(queries):
+    return [
+        query for query in queries
+        if query["sql"].startswith('UPDATE "balances"')
+    ]
+
+
+##########################################################################
+## Deferred Balances Tests
+##########################################################################
+
+def test_deferred_balances(balance_sheet, django_capture_on_commit_callbacks):
+    """
+    Balances touched in a deferred block are recomputed once on commit
+    """
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with CaptureQueriesContext(connection) as queries:
+            with deferred_balances():
+                for tx in balance_sheet.transactions.all():
+                    tx.amount += Decimal("1.00")
+                    tx.save()
+
+                    tx.complete = True
+                    tx.save()
+
+                # Balances are stale until the transaction commits
+                assert ending(balance_sheet, "Everyday Checkings") == Decimal("500.00")
+                assert len(dirty_balances()) == 12
+
+    assert len(callbacks) == 1
+    assert len(balance_updates(queries)) == 0
+    assert dirty_balances() is None
+
+    # All transactions are complete so the ending balance is the beginning balance
+    for balance in balance_sheet.balances.all():
+        assert balance.ending == balance.beginning
+
+
+def test_nested_deferred_balances(balance_sheet, django_capture_on_commit_callbacks):
+    """
+    Nested deferred blocks are recomputed by the outermost block
+    """
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with deferred_balances():
+            balance_sheet.transactions.filter(amount=Decimal("750.61")).delete()
+
+            with deferred_balances():
+                tx = balance_sheet.transactions.get(amount=Decimal("1598.33"))
+                tx.amount = Decimal("1600.00")
+                tx.save()
+
+    assert len(callbacks) == 1
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("-252.28")
+    assert ending(balance_sheet, "Performance Savings") == Decimal("46322.21")
+    assert ending(balance_sheet, "Rewards Mastercard") == Decimal("-276.23")
+
+
+def test_deferred_balances_rollback(balance_sheet, django_capture_on_commit_callbacks):
+    """
+    Nothing is recomputed if the deferred block is rolled back
+    """
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with pytest.raises(ValueError):
+            with deferred_balances():
+                balance_sheet.transactions.all().delete()
+                raise ValueError("rollback")
+
+    assert len(callbacks) == 0
+    assert dirty_balances() is None
+    assert balance_sheet.transactions.count() == 11
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("500.00")
+
+
+##########################################################################
+## Bulk Mode Tests
+##########################################################################
+
+def test_bulk_mode(balance_sheet):
+    """
+    Saves in bulk mode do not update balances until the block exits
+    """
+    with CaptureQueriesContext(connection) as queries:
+        with bulk_mode():
+            for tx in balance_sheet.transactions.all():
+                tx.complete = True
+                tx.save()
+
+            assert bulk_sheets() == {balance_sheet.id}
+            assert ending(balance_sheet, "Everyday Checkings") == Decimal("500.00")
+
+    assert bulk_sheets() is None
+    assert len(balance_updates(queries)) == 1
+
+    for balance in balance_sheet.balances.all():
+        assert balance.ending == balance.beginning
+
+    # The saved transactions were loaded, so their stored rows are not fetched
+    fetches = [
+        query for query in queries if query["sql"].startswith('SELECT "transactions"')
+    ]
+    assert len(fetches) == 1
+
+
+def test_bulk_mode_move_sheet(balance_sheet):
+    """
+    Moving a transaction in bulk mode recomputes both the old and the new sheet
+    """
+    other = BalanceSheet.objects.create(date=balance_sheet.date.replace(year=2000))
+    for balance in balance_sheet.balances.all():
+        Balance.objects.create(sheet=other, account=balance.account, beginning=0)
+
+    tx = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    with bulk_mode():
+        tx.sheet = other
+        tx.save()
+        assert bulk_sheets() == {balance_sheet.id, other.id}
+
+    assert ending(other, "Everyday Checkings") == Decimal("750.61")
+    assert ending(other, "Performance Savings") == Decimal("-750.61")
+
+    # Both sheets were recomputed so nothing has drifted
+    sheets = [balance_sheet, other]
+    assert Balance.objects.filter(sheet__in=sheets).recompute_ending() == 0
+
+
+def test_bulk_mode_move_constructed(balance_sheet):
+    """
+    Moving a transaction constructed with an existing primary key in bulk mode
+    recomputes both the old and the new sheet
+    """
+    other = BalanceSheet.objects.create(date=balance_sheet.date.replace(year=2000))
+    for balance in balance_sheet.balances.all():
+        Balance.objects.create(sheet=other, account=balance.account, beginning=0)
+
+    stored = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    tx = Transaction(
+        pk=stored.pk, sheet=other, date=stored.date, credit_id=stored.credit_id,
+        debit_id=stored.debit_id, amount=stored.amount, complete=stored.complete,
+    )
+
+    with bulk_mode():
+        tx.save()
+        assert bulk_sheets() == {balance_sheet.id, other.id}
+
+    assert ending(other, "Everyday Checkings") == Decimal("750.61")
+    sheets = [balance_sheet, other]
+    assert Balance.objects.filter(sheet__in=sheets).recompute_ending() == 0
+
+
+def test_bulk_mode_rollback(balance_sheet):
+    """
+    Nothing is recomputed if the bulk mode block is rolled back
+    """
+    with pytest.raises(ValueError):
+        with bulk_mode():
+            balance_sheet.transactions.update(complete=True)
+            balance_sheet.transactions.all().delete()
+            raise ValueError("rollback")
+
+    assert bulk_sheets() is None
+    assert balance_sheet.transactions.count() == 11
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("500.00")
+
+
+def test_bulk_create_transactions(balance_sheet):
+    """
+    Bulk created transactions update the balances with one statement
+    """
+    checking = balance_sheet.balances.get(account__name="Everyday Checkings").account
+    savings = balance_sheet.balances.get(account__name="Performance Savings").account
+
+    transactions = [
+        Transaction(
+            sheet=balance_sheet, credit=checking, debit=savings,
+            amount=Decimal("100.00"), date=balance_sheet.date,
+        )
+        for _ in range(5)
+    ]
+
+    with CaptureQueriesContext(connection) as queries:
+        Transaction.objects.bulk_create(transactions)
+
+    assert len(balance_updates(queries)) == 1
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("0.00")
+    assert ending(balance_sheet, "Performance Savings") == Decimal("46071.60")
+
+
+def test_bulk_update_transactions(balance_sheet):
+    """
+    Bulk updated transactions recompute the balances before and after the update
+    """
+    transactions = list(balance_sheet.transactions.all())
+    for tx in transactions:
+        tx.complete = True
+
+    with CaptureQueriesContext(connection) as queries:
+        Transaction.objects.bulk_update(transactions, ["complete"])
+
+    assert len(balance_updates(queries)) == 1
+    for balance in balance_sheet.balances.all():
+        assert balance.ending == balance.beginning
+
+    # Fields that do not affect the balances do not recompute them
+    for tx in transactions:
+        tx.memo = "updated"
+
+    with CaptureQueriesContext(connection) as queries:
+        Transaction.objects.bulk_update(transactions, ["memo"])
+    assert len(balance_updates(queries)) == 0
+
+
+def test_bulk_update_balances(balance_sheet):
+    """
+    Bulk updated beginning balances recompute the ending balances
+    """
+    balances = list(balance_sheet.balances.all())
+    for balance in balances:
+        balance.beginning += Decimal("10.00")
+
+    with bulk_mode():
+        Balance.objects.bulk_update(balances, ["beginning"])
+        assert bulk_sheets() == {balance_sheet.id}
+
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("510.00")
+    assert ending(balance_sheet, "Rewards Mastercard") == Decimal("-267.90")
+
+
+def test_recompute_large_batches(balance_sheet, monkeypatch):
+    """
+    Large batches are recomputed by sheet and account rather than by pair
+    """
+    monkeypatch.setattr("accounts.balances.MAX_BALANCE_PAIRS", 0)
+    transactions = list(balance_sheet.transactions.all())
+    for tx in transactions:
+        tx.complete = True
+
+    Transaction.objects.bulk_update(transactions, ["complete"])
+    for balance in balance_sheet.balances.all():
+        assert balance.ending == balance.beginning
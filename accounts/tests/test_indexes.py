@@ -0,0 +1,93 @@
+# accounts.tests.test_indexes
+# Query plan regression tests for the ledger's indexes.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 15:21:40 2026 -0400
+#
+# ID: test_indexes.py [] benjamin@bengfort.com $
+
+"""
+Query plan regression tests for the ledger's indexes.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import pytest
+
+from decimal import Decimal
+from django.db import connection
+from dateutil.relativedelta import relativedelta
+
+from accounts.models import BalanceSheet, Balance, Transaction
+from .factories import this_month, AccountFactory, BillingAccountFactory
+
+# All tests in this module use the database
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def ledger(db):
+    """
+    A synthetic ledger of decades of sheets, the last few years of which have many
+    transactions each.
+    """
+    sheets = BalanceSheet.objects.bulk_create([
+        BalanceSheet(date=this_month() - relativedelta(months=n), title=f"Sheet {n}")
+        for n in range(600)
+    ])
+
+    accounts = [AccountFactory(name=f"Account {n}") for n in range(25)]
+    accounts += [BillingAccountFactory(name=f"Bill {n}") for n in range(25)]
+
+    Transaction.objects.bulk_create([
+        Transaction(
+            sheet=sheet, date=sheet.date, amount=Decimal("10.00") + n,
+            credit=accounts[n % 25], debit=accounts[25 + n % 23], complete=n % 3 == 0,
+        )
+        for sheet in sheets[:36]
+        for n in range(250)
+    ])
+
+    # Update the statistics so the planner sees the size of the ledger
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE balance_sheets, transactions")
+
+    return sheets, accounts
+
+
+##########################################################################
+## Query Plan Tests
+##########################################################################
+
+@pytest.mark.parametrize("account", [0, 25])
+def test_transaction_totals_plan(ledger, account):
+    """
+    The transaction totals of a balance are index only scans of both sides
+    """
+    sheets, accounts = ledger
+    balance = Balance(sheet=sheets[0], account=accounts[account])
+
+    plan = balance._transaction_totals_query().explain()
+    assert "Index Only Scan using transactions_sheet_credit_idx" in plan
+    assert "Index Only Scan using transactions_sheet_debit_idx" in plan
+
+
+def test_payment_transactions_plan(ledger):
+    """
+    Transactions between two accounts use the debit and credit index
+    """
+    _, accounts = ledger
+    query = Transaction.objects.filter(debit=accounts[25], credit=accounts[0])
+
+    plan = query.order_by().explain()
+    assert "transactions_debit_credit_idx" in plan
+
+
+def test_sheet_date_plan(ledger):
+    """
+    Balance sheets are looked up by date with the date index
+    """
+    plan = BalanceSheet.objects.filter(date=this_month()).order_by().explain()
+    assert "balance_sheets_date_idx" in plan
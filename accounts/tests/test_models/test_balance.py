@@ -18,7 +18,10 @@ import re
 import pytest
 
 from decimal import Decimal
-from accounts.models import BalanceSheet, Payment, Transaction
+from dateutil.relativedelta import relativedelta
+from django.db import transaction, IntegrityError
+from django.core.management import call_command
+from accounts.models import BalanceSheet, Balance, Payment, Transaction
 
 from ..factories import this_month
 from ..factories import PaymentFactory
@@ -49,6 +52,36 @@ def test_balance_sheet_title():
     assert SHEET_TITLE.match(b.title)
 
 
+def test_balance_sheet_unique_month():
+    """
+    Only one balance sheet can be created per month
+    """
+    BalanceSheetFactory.create(date=this_month(1))
+    BalanceSheetFactory.create(date=this_month(1) + relativedelta(months=1))
+
+    with pytest.raises(IntegrityError):
+        with transaction.atomic():
+            BalanceSheetFactory.create(date=this_month(15))
+
+
+def test_balance_sheet_get_month():
+    """
+    Month lookups are a date range rather than extracting the month of each sheet
+    """
+    sheet = BalanceSheetFactory.create(date=this_month(4))
+    BalanceSheetFactory.create(date=this_month(1) + relativedelta(months=1))
+    BalanceSheetFactory.create(date=this_month(1) - relativedelta(days=1))
+
+    query = str(BalanceSheet.objects.in_month(sheet.date.year, sheet.date.month).query)
+    assert "EXTRACT" not in query
+
+    assert BalanceSheet.objects.get_month(sheet.date.year, sheet.date.month) == sheet
+    assert BalanceSheet.objects.get_date(sheet.date.strftime("%Y-%m")) == sheet
+
+    with pytest.raises(BalanceSheet.DoesNotExist):
+        BalanceSheet.objects.get_month(sheet.date.year - 1, sheet.date.month)
+
+
 @pytest.mark.skip(reason="requires freezegun to test accurately")
 def test_balance_sheet_active():
     """
@@ -156,6 +189,270 @@ def test_balance_sheet_scenario():
     assert sheet.balances.credit_accounts().count() == 2
 
 
+def ending(sheet, account):
+    if isinstance(account, str):
+        return sheet.balances.get(account__name=account).ending
+    return sheet.balances.get(account=account).ending
+
+
+def test_transaction_amount_update(balance_sheet):
+    """
+    Changing the amount of a transaction applies only the difference to balances
+    """
+    tx = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    tx.amount = Decimal("1000.00")
+    tx.save()
+
+    assert ending(balance_sheet, tx.credit) == Decimal("45322.21")
+    assert ending(balance_sheet, tx.debit) == Decimal("749.39")
+
+
+def test_transaction_account_reassignment(balance_sheet):
+    """
+    Reassigning the credit account moves the amount from one balance to another
+    """
+    tx = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    savings, checking = tx.credit, tx.debit
+    mastercard = balance_sheet.accounts.get(name="Rewards Mastercard")
+
+    tx.credit = mastercard
+    tx.save()
+
+    assert ending(balance_sheet, savings) == Decimal("46322.21")
+    assert ending(balance_sheet, mastercard) == Decimal("-1028.51")
+    assert ending(balance_sheet, checking) == Decimal("500.00")
+
+
+def test_transaction_sheet_reassignment(balance_sheet):
+    """
+    Moving a transaction to another sheet updates the balances on both sheets
+    """
+    tx = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    other = BalanceSheetFactory(date=this_month(1) - relativedelta(months=1))
+    BalanceFactory(sheet=other, account=tx.credit, beginning=Decimal("100.00"))
+    BalanceFactory(sheet=other, account=tx.debit, beginning=Decimal("100.00"))
+
+    tx.sheet = other
+    tx.save()
+
+    assert ending(balance_sheet, tx.credit) == Decimal("46322.21")
+    assert ending(balance_sheet, tx.debit) == Decimal("-250.61")
+    assert ending(other, tx.credit) == Decimal("-650.61")
+    assert ending(other, tx.debit) == Decimal("850.61")
+
+
+def test_transaction_completed(balance_sheet):
+    """
+    Completed transactions are included in the beginning balance, not the ending
+    """
+    tx = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    tx.complete = True
+    tx.save()
+
+    assert ending(balance_sheet, tx.credit) == Decimal("46322.21")
+    assert ending(balance_sheet, tx.debit) == Decimal("-250.61")
+
+    tx.complete = False
+    tx.save()
+
+    assert ending(balance_sheet, tx.credit) == Decimal("45571.60")
+    assert ending(balance_sheet, tx.debit) == Decimal("500.00")
+
+
+def test_transaction_delete(balance_sheet):
+    """
+    Deleting a transaction reverses its amount on the credit and debit balances
+    """
+    tx = balance_sheet.transactions.get(amount=Decimal("750.61"))
+    tx.delete()
+
+    assert ending(balance_sheet, tx.credit) == Decimal("46322.21")
+    assert ending(balance_sheet, tx.debit) == Decimal("-250.61")
+
+
+def test_transaction_queryset_delete(balance_sheet, django_assert_max_num_queries):
+    """
+    Bulk deletes reverse the deleted amounts without a recompute per balance
+    """
+    checking = balance_sheet.accounts.get(name="Everyday Checkings")
+    credits = balance_sheet.transactions.filter(credit=checking)
+    assert credits.count() == 4
+
+    with django_assert_max_num_queries(8):
+        credits.delete()
+
+    assert ending(balance_sheet, checking) == Decimal("6072.17")
+    assert ending(balance_sheet, "Rewards Mastercard") == Decimal("-1876.23")
+    call_command("checkbalances", sheet=balance_sheet.date.strftime("%Y-%m"))
+
+
+def test_balance_sheet_delete(balance_sheet):
+    """
+    Deleting a sheet removes its balances and transactions together
+    """
+    balance_sheet.delete()
+    assert not Transaction.objects.exists()
+    assert not Balance.objects.exists()
+
+
+def test_recompute_balances(balance_sheet, django_assert_num_queries):
+    """
+    Recomputing the sheet repairs balances modified without the ORM signals
+    """
+    # Queryset updates bypass the signals so the ending balances drift
+    balance_sheet.transactions.update(amount=Decimal("10.00"))
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("500.00")
+
+    with django_assert_num_queries(1):
+        assert balance_sheet.recompute_balances() == 4
+
+    assert ending(balance_sheet, "Everyday Checkings") == Decimal("5291.56")
+    assert ending(balance_sheet, "Performance Savings") == Decimal("46312.21")
+    assert ending(balance_sheet, "Rewards Mastercard") == Decimal("-1832.49")
+    assert ending(balance_sheet, "Mileage Visa") == Decimal("-4903.11")
+
+    # Balances that are already correct are not rewritten
+    assert balance_sheet.recompute_balances() == 0
+
+
+def test_recompute_empty(django_assert_num_queries):
+    """
+    Recomputing or carrying forward a queryset that cannot match any balances
+    does not query
+    """
+    with django_assert_num_queries(0):
+        assert Balance.objects.filter(pk__in=[]).recompute_ending() == 0
+        assert Balance.objects.none().recompute_ending() == 0
+        assert Balance.objects.none().carry_forward(BalanceSheet(pk=1)) == 0
+
+
+def test_balance_sheet_edit_does_not_recompute(balance_sheet, django_assert_num_queries):
+    """
+    Editing the title or memo of the sheet does not touch its balances
+    """
+    balance_sheet.memo = "paid all of the bills"
+    with django_assert_num_queries(1):
+        balance_sheet.save()
+
+
+def test_transaction_totals(balance_sheet, django_assert_num_queries):
+    """
+    Credit and debit totals are computed in a single query
+    """
+    balance = balance_sheet.balances.get(account__name="Everyday Checkings")
+    balance_sheet.transactions.filter(credit=balance.account, amount=Decimal("68.97")).update(complete=True)
+
+    expected = {
+        "credits_pending": Decimal("-5503.20"),
+        "credits_completed": Decimal("-68.97"),
+        "debits_pending": Decimal("750.61"),
+        "debits_completed": Decimal("0"),
+    }
+
+    with django_assert_num_queries(1):
+        assert balance.transaction_totals() == expected
+
+    with django_assert_num_queries(1):
+        balances = list(balance_sheet.balances.with_transaction_totals())
+
+    with django_assert_num_queries(0):
+        for annotated in balances:
+            if annotated.pk == balance.pk:
+                assert annotated.transaction_totals() == expected
+            else:
+                assert annotated.credit_amount(completed=True) == Decimal("0")
+
+
+def test_incremental_balances_match_recompute(balance_sheet):
+    """
+    Incrementally maintained ending balances should match a full recompute
+    """
+    for tx in balance_sheet.transactions.all():
+        tx.amount += Decimal("1.01")
+        tx.save()
+
+    # Raises a CommandError if any of the ending balances have drifted
+    call_command("checkbalances", sheet=balance_sheet.date.strftime("%Y-%m"))
+
+
+def test_roll_forward(balance_sheet, django_assert_max_num_queries):
+    """
+    Rolling forward carries ending balances and due payments to the next sheet
+    """
+    checking = balance_sheet.accounts.get(name="Everyday Checkings")
+    visa = balance_sheet.accounts.get(name="Mileage Visa")
+    visa.active = False
+    visa.save()
+
+    rent = BillingAccountFactory(name="Rent")
+    PaymentFactory(
+        credit=checking, debit=rent, frequency=Payment.MONTHLY, day=15,
+        amount=Decimal("100.00"),
+    )
+    PaymentFactory(
+        credit=checking, debit=rent, frequency=Payment.MONTHLY, day=1,
+        amount=Decimal("25.00"), active=False,
+    )
+    PaymentFactory(credit=checking, debit=rent, frequency=Payment.INFREQUENT, day=None)
+
+    # Does not grow with the number of balances or payments
+    with django_assert_max_num_queries(10):
+        sheet = balance_sheet.roll_forward()
+
+    assert sheet.date == balance_sheet.date + relativedelta(months=1)
+    assert sheet.balances.count() == 3
+    assert not sheet.balances.filter(account=visa).exists()
+
+    tx = sheet.transactions.get()
+    assert tx.date == sheet.date + relativedelta(day=15)
+    assert tx.amount == Decimal("100.00")
+
+    balance = sheet.balances.get(account=checking)
+    assert balance.beginning == Decimal("500.00")
+    assert balance.ending == Decimal("400.00")
+    assert ending(sheet, "Performance Savings") == Decimal("45571.60")
+
+    # Only one balance sheet per month
+    with pytest.raises(ValueError):
+        balance_sheet.roll_forward()
+
+    call_command("checkbalances", sheet=sheet.date.strftime("%Y-%m"))
+
+
+def test_roll_forward_current_month():
+    """
+    Payments without a next payment date are not added when rolling into this month
+    """
+    # Rolling forward into the current month means that today is in the new month
+    sheet = BalanceSheetFactory(date=this_month() - relativedelta(months=1))
+    checking = AccountFactory(name="Current Checking")
+    BalanceFactory(sheet=sheet, account=checking, beginning=Decimal("100.00"))
+
+    rent = BillingAccountFactory(name="Rent")
+    PaymentFactory(credit=checking, debit=rent, frequency=Payment.INFREQUENT, day=None)
+    PaymentFactory(
+        credit=checking, debit=rent, frequency=Payment.MONTHLY, day=15,
+        amount=Decimal("10.00"),
+    )
+
+    rolled = sheet.roll_forward()
+    assert rolled.date == this_month()
+
+    tx = rolled.transactions.get()
+    assert tx.date == this_month(15)
+    assert tx.amount == Decimal("10.00")
+
+
+def test_roll_forward_command(balance_sheet):
+    """
+    The rollforward command rolls the latest balance sheet forward
+    """
+    call_command("rollforward")
+    sheet = BalanceSheet.objects.latest()
+    assert sheet.date == balance_sheet.date + relativedelta(months=1)
+    assert sheet.balances.count() == 4
+
+
 def test_transaction_from_payment():
     """
     Test creating a transaction from a Payment
@@ -16,6 +16,9 @@ Test the credit score models
 
 import pytest
 
+from datetime import date
+from accounts.models import CreditScore
+
 from ..factories import *
 
 # All tests in this module use the database
@@ -40,3 +43,110 @@ def test_credit_score(score, description, percent):
     score = CreditScoreFactory(score=score)
     assert score.description == description
     assert score.percent == percent
+
+
+@pytest.fixture()
+def credit_scores(db):
+    """
+    Monthly credit scores from two bureaus.
+    """
+    scores = {
+        CreditScore.EXPERIAN: [700, 720, 720, 690],
+        CreditScore.EQUIFAX: [650, 640, 660],
+    }
+
+    for source, history in scores.items():
+        for months, score in enumerate(history):
+            CreditScoreFactory(
+                source=source, score=score, date=date(2020, months + 1, 15),
+            )
+    return scores
+
+
+def test_first_credit_score_trend():
+    """
+    The first score from a source has a flat trend and no delta
+    """
+    score = CreditScoreFactory(source=CreditScore.EXPERIAN)
+    assert score.previous_score() is None
+    assert score.trend() == "flat"
+    assert score.delta() is None
+
+
+def test_credit_score_trend(credit_scores):
+    """
+    The trend compares the score with the previous score from the same source
+    """
+    scores = CreditScore.objects.filter(source=CreditScore.EXPERIAN).order_by("date")
+    assert [score.trend() for score in scores] == ["flat", "up", "flat", "down"]
+    assert [score.delta() for score in scores] == [None, 20, 0, -30]
+
+
+def test_with_trend(credit_scores, django_assert_num_queries):
+    """
+    The previous score of every score is annotated in a single query
+    """
+    with django_assert_num_queries(1):
+        scores = list(CreditScore.objects.with_trend().order_by("source", "date"))
+        trends = [(score.source, score.trend(), score.delta()) for score in scores]
+
+    assert trends == [
+        (CreditScore.EQUIFAX, "flat", None),
+        (CreditScore.EQUIFAX, "down", -10),
+        (CreditScore.EQUIFAX, "up", 20),
+        (CreditScore.EXPERIAN, "flat", None),
+        (CreditScore.EXPERIAN, "up", 20),
+        (CreditScore.EXPERIAN, "flat", 0),
+        (CreditScore.EXPERIAN, "down", -30),
+    ]
+
+    # The annotations match the per-score queries
+    for score in scores:
+        fresh = CreditScore.objects.get(pk=score.pk)
+        assert fresh.previous_score() == score.prev_score
+
+
+def test_with_trend_sliced(credit_scores):
+    """
+    Slicing the scores does not change their previous scores
+    """
+    latest = CreditScore.objects.with_trend().latest()
+    assert latest.score == 690
+    assert latest.delta() == -30
+
+
+def test_latest_preferred(credit_scores, django_assert_num_queries):
+    """
+    The latest preferred score is compared with the previous score from its source,
+    even if that score is not preferred
+    """
+    CreditScore.objects.filter(score__in=[640, 690]).update(preferred=False)
+
+    with django_assert_num_queries(1):
+        latest = CreditScore.objects.latest_preferred()
+        assert latest.score == 660
+        assert latest.delta() == 20
+
+    CreditScore.objects.filter(score=660).update(preferred=False)
+    latest = CreditScore.objects.latest_preferred()
+    assert latest.score == 720
+    assert latest.delta() == 0
+
+    CreditScore.objects.update(preferred=False)
+    with pytest.raises(CreditScore.DoesNotExist):
+        CreditScore.objects.latest_preferred()
+
+
+def test_same_day_previous_score(credit_scores):
+    """
+    Scores from a source on the same date are ordered by id in both trend paths
+    """
+    first = CreditScoreFactory(source=CreditScore.EQUIFAX, score=600, date=date(2020, 4, 1))
+    second = CreditScoreFactory(source=CreditScore.EQUIFAX, score=610, date=date(2020, 4, 1))
+
+    annotated = {score.pk: score for score in CreditScore.objects.with_trend()}
+    assert annotated[first.pk].prev_score == 660
+    assert annotated[second.pk].prev_score == 600
+
+    assert CreditScore.objects.get(pk=first.pk).previous_score() == 660
+    assert CreditScore.objects.get(pk=second.pk).previous_score() == 600
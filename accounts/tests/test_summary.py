@@ -0,0 +1,224 @@
+# accounts.tests.test_summary
+# Tests for the balance sheet summaries of the overview dashboard.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 17:12:08 2026 -0400
+#
+# ID: test_summary.py [] benjamin@bengfort.com $
+
+"""
+Tests for the balance sheet summaries of the overview dashboard.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import pytest
+
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+
+from taxes.models import TaxReturn
+from accounts.models import CreditScore
+from accounts.summary import overview, sheet_totals
+from accounts.summary import balance_groups, transaction_summary
+from .factories import this_month, BalanceSheetFactory, BalanceFactory
+from .factories import CreditScoreFactory
+
+# All tests in this module use the database
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def prev_sheet(balance_sheet):
+    """
+    The month before the balance sheet with lower cash balances.
+    """
+    sheet = BalanceSheetFactory(date=this_month() - relativedelta(months=1))
+    for balance in balance_sheet.balances.cash_accounts():
+        BalanceFactory(
+            sheet=sheet, account=balance.account,
+            beginning=balance.beginning - Decimal("1000.00"),
+        )
+    return sheet
+
+
+##########################################################################
+## Summary Tests
+##########################################################################
+
+def test_sheet_totals(balance_sheet, prev_sheet, django_assert_num_queries):
+    """
+    Totals by account type are computed for every sheet in one query
+    """
+    with django_assert_num_queries(1):
+        totals = sheet_totals([balance_sheet, prev_sheet])
+
+    cash = totals[balance_sheet.pk]["cash"]
+    assert cash == {
+        "count": 2,
+        "beginning": Decimal("51643.77"),
+        "ending": Decimal("46071.60"),
+    }
+
+    credit = totals[balance_sheet.pk]["credit"]
+    assert credit == {
+        "count": 2,
+        "beginning": Decimal("-6695.60"),
+        "ending": Decimal("-2220.15"),
+    }
+
+    # The sums match the aggregates of the filtered querysets
+    for kind in ("cash", "credit", "loan", "investment"):
+        expected = getattr(balance_sheet.balances, f"{kind}_accounts")()
+        assert totals[balance_sheet.pk][kind]["count"] == expected.count()
+        assert totals[balance_sheet.pk][kind]["beginning"] == expected.totals()["beginning__sum"]
+        assert totals[balance_sheet.pk][kind]["ending"] == expected.totals()["ending__sum"]
+
+    assert totals[prev_sheet.pk]["cash"]["ending"] == Decimal("49643.77")
+    assert totals[prev_sheet.pk]["credit"] == {"count": 0, "beginning": None, "ending": None}
+
+
+def test_sheet_totals_excluded(balance_sheet):
+    """
+    Inactive and excluded accounts are counted but not summed
+    """
+    balance = balance_sheet.balances.cash_accounts().get(beginning=Decimal("5321.56"))
+    balance.account.exclude = True
+    balance.account.save()
+
+    totals = sheet_totals([balance_sheet])[balance_sheet.pk]["cash"]
+    assert totals["count"] == 2
+    assert totals["beginning"] == Decimal("46322.21")
+
+
+def test_overview(balance_sheet, prev_sheet, django_assert_num_queries):
+    """
+    The overview summary compares the latest sheet with the previous sheet
+    """
+    with django_assert_num_queries(3):
+        summary = overview()
+
+    assert summary["latest"] == balance_sheet
+    assert summary["previous"] == prev_sheet
+    assert summary["totals"]["cash"]["ending"] == Decimal("46071.60")
+    assert summary["prev_totals"]["cash"]["ending"] == Decimal("49643.77")
+    assert summary["monthly_savings"] == Decimal("-3572.17")
+    assert summary["investment_increase"] == 0
+
+    transactions = summary["transactions"]
+    assert transactions["count"] == 11
+    assert transactions["earliest"] == this_month(1)
+    assert transactions["latest"] == this_month(21)
+
+
+def test_overview_single_sheet(balance_sheet):
+    """
+    Without a previous sheet there are no savings or investment changes
+    """
+    summary = overview()
+    assert summary["previous"] is None
+    assert summary["prev_totals"] is None
+    assert summary["monthly_savings"] == 0
+    assert summary["investment_increase"] == 0
+
+
+def test_overview_no_sheets():
+    assert overview() is None
+
+
+def test_overview_view(admin_client, balance_sheet, prev_sheet, django_assert_max_num_queries):
+    """
+    The overview dashboard renders the summary with a small number of queries
+    """
+    TaxReturn.objects.create(
+        year=2018, wages=100, income=100, agi=100, taxable_income=100,
+        federal_tax=10, local_tax=5,
+    )
+    for months in range(4):
+        CreditScoreFactory(source=CreditScore.EXPERIAN, date=this_month() - relativedelta(months=months))
+
+    with django_assert_max_num_queries(11):
+        rep = admin_client.get("/")
+
+    assert rep.status_code == 200
+    assert rep.context["monthly_savings"] == Decimal("-3572.17")
+    assert rep.context["latest_totals"]["cash"]["count"] == 2
+    assert b"11 transactions" in rep.content
+
+
+##########################################################################
+## Balance Group Tests
+##########################################################################
+
+def test_balance_groups(balance_sheet, django_assert_num_queries):
+    """
+    Balances are grouped by type with counts and totals from a single query
+    """
+    with django_assert_num_queries(1):
+        groups = balance_groups(balance_sheet)
+
+        for group in groups.values():
+            for balance in group:
+                assert balance.account.bank is not None
+                assert balance.get_api_url()
+
+    assert groups["cash"].count == 2
+    assert groups["credit"].count == 2
+    assert len(groups["loan"]) == 0
+
+    for kind in ("cash", "credit", "loan", "investment"):
+        expected = getattr(balance_sheet.balances, f"{kind}_accounts")()
+        assert {balance.pk for balance in groups[kind]} == {balance.pk for balance in expected}
+        assert groups[kind].totals == expected.totals()
+
+
+def test_balance_groups_excluded(balance_sheet):
+    """
+    Inactive and excluded accounts are grouped but not summed
+    """
+    balance = balance_sheet.balances.cash_accounts().get(beginning=Decimal("5321.56"))
+    balance.account.active = False
+    balance.account.save()
+
+    group = balance_groups(balance_sheet)["cash"]
+    assert group.count == 2
+    assert group.totals == {
+        "beginning__sum": Decimal("46322.21"), "ending__sum": Decimal("45571.60"),
+    }
+
+
+##########################################################################
+## Transaction Summary Tests
+##########################################################################
+
+def test_transaction_summary(balance_sheet, django_assert_num_queries):
+    """
+    Transactions are summarized in the same pass as they are fetched
+    """
+    with django_assert_num_queries(1):
+        summary = transaction_summary(balance_sheet)
+        for transaction in summary:
+            assert str(transaction.credit) and str(transaction.debit)
+            assert transaction.credit.currency
+
+    assert summary.count == 11
+    assert summary.earliest == this_month(1)
+    assert summary.latest == this_month(21)
+
+    transactions = balance_sheet.transactions
+    assert summary.expenses == transactions.expenses().total()
+    assert summary.transfers == transactions.transfers().total()
+    assert summary.expenses["amount__sum"] == Decimal("6407.70")
+    assert summary.transfers["amount__sum"] == Decimal("750.61")
+
+
+def test_empty_transaction_summary(balance_sheet):
+    balance_sheet.transactions.all().delete()
+
+    summary = transaction_summary(balance_sheet)
+    assert summary.count == 0
+    assert summary.earliest is None and summary.latest is None
+    assert summary.expenses == {"amount__sum": None}
+    assert summary.transfers == {"amount__sum": None}
@@ -17,9 +17,13 @@ Test the template tag utilities using simple Django templates
 import pytest
 
 from django.test import SimpleTestCase
+from django.core.cache import cache
 from django.template import Context, Template
 
 from accounts.templatetags.accounting import *
+from accounts.models import BalanceSheet
+from accounts.utils import billing_month
+from accounts.cache import SHEETS_VERSION_KEY, get_current_sheet
 
 
 @pytest.mark.parametrize("amount, currency, expected", [
@@ -111,9 +115,52 @@ class TestAccountingTags(SimpleTestCase):
         rendered = template.render(Context({}))
         self.assertInHTML('<i class="icon icon-left mdi mdi-edit">', rendered)
 
-    @pytest.mark.skip(reason="needs implementation")
-    def test_next_sheet(self):
-        """
-        Test the next_sheet inclusion tag
-        """
-        pass
+
+##########################################################################
+## Database Template Tags Tests
+##########################################################################
+
+@pytest.mark.django_db
+def test_next_sheet(django_assert_num_queries):
+    """
+    Test the next_sheet inclusion tag is cached until a sheet is saved
+    """
+    template = Template('{% load accounting %}{% next_sheet %}')
+
+    with django_assert_num_queries(1):
+        rendered = template.render(Context({}))
+    assert "Create Sheet for" in rendered
+
+    # The current sheet is cached between renders
+    with django_assert_num_queries(0):
+        template.render(Context({}))
+
+    # Creating the sheet invalidates the cache
+    sheet = BalanceSheet.objects.create(date=billing_month())
+    with django_assert_num_queries(1):
+        rendered = template.render(Context({}))
+    assert sheet.get_absolute_url() in rendered
+
+    with django_assert_num_queries(0):
+        template.render(Context({}))
+
+    # Other processes are invalidated by the version stamp
+    cache.set(SHEETS_VERSION_KEY, "other")
+    with django_assert_num_queries(1):
+        template.render(Context({}))
+
+
+@pytest.mark.django_db
+def test_current_sheet_billing_month(monkeypatch, django_assert_num_queries):
+    """
+    The current sheet is cached for the billing month rather than for the day
+    """
+    today = billing_month().replace(day=1)
+    monkeypatch.setattr("accounts.cache.billing_month", lambda: today)
+    cache.set(SHEETS_VERSION_KEY, "current")
+    get_current_sheet()
+
+    # Before the billing day, the billing month changes every day
+    monkeypatch.setattr("accounts.cache.billing_month", lambda: today.replace(day=2))
+    with django_assert_num_queries(0):
+        get_current_sheet()
@@ -19,16 +19,22 @@ Tests for the API views in the accounts app.
 
 import pytest
 
+from decimal import Decimal
+from itertools import count
+from dateutil.relativedelta import relativedelta
 from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework.reverse import reverse
 
 from datetime import timedelta
 from ..factories import AdminUserFactory, UserFactory, PaymentFactory
+from ..factories import CompanyFactory, CreditCardPaymentFactory, CreditScoreFactory
 from ..factories import this_month, AccountFactory, BillingAccountFactory
 from ..factories import BalanceSheetFactory, BalanceFactory, TransactionFactory
 
-from accounts.models import BalanceSheet
+from accounts.models import BalanceSheet, CreditScore
 
 
 # All tests in this module use the database
@@ -108,6 +114,39 @@ def test_nested_list_requires_authentication(admin_client):
         assert rep.status_code == status.HTTP_403_FORBIDDEN, "allowed public access"
 
 
+def test_list_queries_do_not_grow(admin_client, balance_sheet, assert_constant_queries):
+    """
+    Related objects used by the serializers are not fetched once per row
+    """
+    names = count(1)
+
+    def account():
+        n = next(names)
+        bank = CompanyFactory(name="Bank {}".format(n), short_name="B{}".format(n))
+        return AccountFactory(name="Account {}".format(n), bank=bank)
+
+    def balance():
+        BalanceFactory(sheet=balance_sheet, account=account())
+
+    def transaction():
+        TransactionFactory(sheet=balance_sheet, credit=account(), debit=account())
+
+    def payment():
+        CreditCardPaymentFactory(credit=account(), debit=account())
+
+    cases = [
+        (reverse("api:accounts-list"), account),
+        (reverse("api:payments-list"), payment),
+        (balance_sheet.get_api_url(), balance),
+        (balance_sheet.get_api_url(), transaction),
+        (balance_sheet.get_api_balances_url(), balance),
+        (balance_sheet.get_api_transactions_url(), transaction),
+    ]
+
+    for url, create in cases:
+        assert_constant_queries(admin_client, url, create)
+
+
 ##########################################################################
 ## Test BalanceSheet ViewSet
 ##########################################################################
@@ -128,6 +167,30 @@ class TestBalanceSheetViewSet(object):
         assert rep.status_code == status.HTTP_200_OK
         assert len(rep.json()) == 2
 
+    def test_sheets_list_summary(
+        self, admin_client, balance_sheet, assert_constant_queries
+    ):
+        url = reverse("api:sheets-list")
+
+        rep = admin_client.get(url)
+        assert rep.status_code == status.HTTP_200_OK
+
+        data = rep.json()[0]
+        assert data["num_transactions"] == 11
+        assert data["num_accounts"] == {"Cash": 2, "Credit Card": 2}
+
+        # The number of queries does not grow with the number of sheets
+        months = count(1)
+
+        def create():
+            date = this_month() - relativedelta(months=next(months))
+            sheet = BalanceSheetFactory.create(date=date)
+            BalanceFactory.create(sheet=sheet)
+            TransactionFactory.create(sheet=sheet)
+
+        rep = assert_constant_queries(admin_client, url, create, rows=3)
+        assert len(rep.json()) == 4
+
     def test_sheets_create(self, admin_client):
         url = reverse("api:sheets-list")
         assert BalanceSheet.objects.count() == 0
@@ -214,6 +277,16 @@ class TestBalanceSheetViewSet(object):
         rep = admin_client.put(url, data, format='json')
         assert rep.status_code == status.HTTP_200_OK
 
+    def test_sheets_refresh(self, admin_client, balance_sheet):
+        balance_sheet.transactions.update(complete=True)
+        url = reverse("api:sheets-refresh", kwargs={"date": balance_sheet.date})
+
+        rep = admin_client.post(url)
+        assert rep.status_code == status.HTTP_200_OK
+
+        for balance in rep.json()["balances"]:
+            assert balance["ending"] == balance["beginning"]
+
     def test_sheets_update_only_one_per_month(self, admin_client, balance_sheet):
         # Create the first balance sheet
         url = reverse("api:sheets-list")
@@ -291,6 +364,34 @@ class TestBalanceViewSet(object):
         rep = admin_client.get(url)
         assert rep.status_code == status.HTTP_200_OK
 
+    def test_balance_detail_transactions(
+        self, admin_client, balance_sheet, assert_constant_queries
+    ):
+        balance = balance_sheet.balances.get(account__name="Everyday Checkings")
+        url = balance.get_api_url()
+
+        rep = admin_client.get(url)
+        assert rep.status_code == status.HTTP_200_OK
+
+        data = rep.json()
+        assert len(data["credits"]) == 4
+        assert len(data["debits"]) == 1
+        assert data["credit_amount"] == -5572.17
+        assert data["debit_amount"] == 750.61
+        assert data["credit_completed_amount"] == 0
+        assert data["debit_completed_amount"] == 0
+
+        # The number of queries does not grow with the number of transactions
+        def create():
+            TransactionFactory.create(
+                sheet=balance_sheet, credit=balance.account,
+                debit=BillingAccountFactory(name="Bill {}".format(next(bills))),
+            )
+
+        bills = count(1)
+        rep = assert_constant_queries(admin_client, url, create)
+        assert len(rep.json()["credits"]) == 9
+
     def test_balance_update(self, admin_client):
         balance = BalanceFactory.create()
         assert balance.beginning != 12.10
@@ -306,6 +407,53 @@ class TestBalanceViewSet(object):
         assert data['beginning'] == 12.10
         assert data['ending'] == 12.10
 
+    def test_balance_bulk_update(self, admin_client, balance_sheet):
+        url = balance_sheet.get_api_balances_url()
+        checking = balance_sheet.balances.get(account__name="Everyday Checkings")
+        mastercard = balance_sheet.accounts.get(name="Rewards Mastercard")
+
+        data = [
+            {"id": checking.id, "beginning": "1000.00"},
+            {"account": mastercard.get_api_url(), "beginning": -100},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            rep = admin_client.patch(url, data, format="json")
+        assert rep.status_code == status.HTTP_200_OK
+
+        # Summary of the update rather than the balance details
+        assert rep.json() == {
+            "sheet": balance_sheet.date.strftime("%Y-%m-%d"),
+            "updated": 2,
+            "beginning": 900.00,
+            "ending": -2376.97,
+        }
+
+        sqls = [query["sql"] for query in queries]
+        assert len([sql for sql in sqls if sql.startswith('UPDATE "balances"')]) == 2
+
+        assert balance_sheet.balances.get(id=checking.id).ending == Decimal("-3821.56")
+        assert balance_sheet.balances.get(account=mastercard).ending == Decimal("1444.59")
+
+    def test_balance_bulk_update_invalid(self, admin_client, balance_sheet):
+        url = balance_sheet.get_api_balances_url()
+        checking = balance_sheet.balances.get(account__name="Everyday Checkings")
+        other = BalanceFactory.create(
+            sheet=BalanceSheetFactory.create(date=this_month() - timedelta(weeks=5))
+        )
+
+        # Balances must be identified by exactly one of id or account
+        data = [{"id": checking.id, "account": checking.account.get_api_url(), "beginning": 1}]
+        rep = admin_client.patch(url, data, format="json")
+        assert rep.status_code == status.HTTP_400_BAD_REQUEST
+
+        # Balances must be on the sheet
+        data = [{"id": checking.id, "beginning": 1}, {"id": other.id, "beginning": 1}]
+        rep = admin_client.patch(url, data, format="json")
+        assert rep.status_code == status.HTTP_400_BAD_REQUEST
+        assert rep.json()[0] == {}
+        assert balance_sheet.balances.get(id=checking.id).beginning == Decimal("5321.56")
+
     @pytest.mark.skip(reason="not yet implemented")
     def test_float_converts_to_decimal(self):
         # Ensure a precision of 2, etc.
@@ -363,6 +511,34 @@ class TestTransactionViewSet(object):
         rep = admin_client.get(url)
         assert rep.status_code == status.HTTP_404_NOT_FOUND
 
+    def test_sheet_resolved_once(self, admin_client, balance_sheet):
+        transaction = balance_sheet.transactions.get(amount=Decimal("750.61"))
+        data = {
+            "date": this_month(18).strftime("%Y-%m-%d"),
+            "credit": transaction.credit.get_api_url(),
+            "debit": transaction.debit.get_api_url(),
+            "amount": 42.24,
+        }
+
+        requests = [
+            ("get", balance_sheet.get_api_transactions_url(), None),
+            ("post", balance_sheet.get_api_transactions_url(), data),
+            ("get", transaction.get_api_url(), None),
+            ("put", transaction.get_api_url(), data),
+            ("get", balance_sheet.get_api_balances_url(), None),
+        ]
+
+        for method, url, data in requests:
+            with CaptureQueriesContext(connection) as queries:
+                rep = getattr(admin_client, method)(url, data, format="json")
+            assert rep.status_code < 300
+
+            sheets = [
+                query for query in queries
+                if query["sql"].startswith('SELECT "balance_sheets"')
+            ]
+            assert len(sheets) == 1, f"{method} {url} fetched the sheet more than once"
+
     def test_transaction_create(self, admin_client):
         credit = AccountFactory.create()
         debit = BillingAccountFactory.create()
@@ -416,6 +592,125 @@ class TestTransactionViewSet(object):
         assert data["debit"].endswith(transaction.debit.get_api_url())
         assert data["complete"] == transaction.complete
 
+    def test_transaction_delete(self, admin_client, balance_sheet, django_capture_on_commit_callbacks):
+        transaction = balance_sheet.transactions.get(amount=Decimal("750.61"))
+        with django_capture_on_commit_callbacks(execute=True):
+            rep = admin_client.delete(transaction.get_api_url())
+        assert rep.status_code == status.HTTP_204_NO_CONTENT
+
+        # Ending balances should be updated on commit without a refresh
+        credit = balance_sheet.balances.get(account=transaction.credit)
+        debit = balance_sheet.balances.get(account=transaction.debit)
+        assert credit.ending == credit.beginning
+        assert debit.ending == Decimal("-250.61")
+
+    def test_transaction_update_deferred(
+        self, admin_client, balance_sheet, django_capture_on_commit_callbacks
+    ):
+        """
+        Transaction writes recompute the touched balances once, when they commit
+        """
+        transaction = balance_sheet.transactions.get(amount=Decimal("750.61"))
+        debit = balance_sheet.accounts.get(name="Rewards Mastercard")
+        assert debit.id not in (transaction.credit_id, transaction.debit_id)
+
+        with CaptureQueriesContext(connection) as queries:
+            with django_capture_on_commit_callbacks() as callbacks:
+                rep = admin_client.put(transaction.get_api_url(), {
+                    "date": transaction.date.strftime("%Y-%m-%d"),
+                    "credit": transaction.credit.get_api_url(),
+                    "debit": debit.get_api_url(),
+                    "amount": "100.00",
+                    "complete": False,
+                }, format="json")
+            assert rep.status_code == status.HTTP_200_OK
+
+            # Nothing is written to the balances until the request commits
+            sqls = [query["sql"] for query in queries]
+            assert not [sql for sql in sqls if sql.startswith('UPDATE "balances"')]
+
+            for callback in callbacks:
+                callback()
+
+        # The old and new debit and the credit are recomputed in one statement
+        sqls = [query["sql"] for query in queries]
+        assert len([sql for sql in sqls if sql.startswith('UPDATE "balances"')]) == 1
+
+        for balance in balance_sheet.balances.all():
+            expected = balance.beginning + sum(
+                tx.amount if tx.debit_id == balance.account_id else -tx.amount
+                for tx in balance_sheet.transactions.filter(complete=False)
+                if balance.account_id in (tx.credit_id, tx.debit_id)
+            )
+            assert balance.ending == expected
+
+    def test_transaction_batch(self, admin_client, balance_sheet, django_capture_on_commit_callbacks):
+        url = reverse(
+            "sheets-api:sheet-transactions-batch",
+            kwargs={"sheet_date": balance_sheet.date.strftime("%Y-%m-%d")},
+        )
+
+        checking = balance_sheet.accounts.get(name="Everyday Checkings")
+        mastercard = balance_sheet.accounts.get(name="Rewards Mastercard")
+        data = [
+            {
+                "date": balance_sheet.date.strftime("%Y-%m-%d"),
+                "credit": checking.get_api_url(),
+                "debit": mastercard.get_api_url(),
+                "amount": "10.00",
+                "complete": False,
+                "memo": "payment {}".format(idx),
+            }
+            for idx in range(10)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            with django_capture_on_commit_callbacks(execute=True):
+                rep = admin_client.post(url, data, format="json")
+        assert rep.status_code == status.HTTP_201_CREATED
+        assert len(rep.json()) == 10
+        assert balance_sheet.transactions.count() == 21
+
+        # Accounts are looked up once and balances are recomputed once
+        sqls = [query["sql"] for query in queries]
+        assert len([sql for sql in sqls if sql.startswith('SELECT "accounts"')]) == 1
+        assert len([sql for sql in sqls if sql.startswith('UPDATE "balances"')]) == 1
+
+        credit = balance_sheet.balances.get(account=checking)
+        debit = balance_sheet.balances.get(account=mastercard)
+        assert credit.ending == Decimal("400.00")
+        assert debit.ending == Decimal("-177.90")
+
+    def test_transaction_batch_invalid(self, admin_client, balance_sheet):
+        url = reverse(
+            "sheets-api:sheet-transactions-batch",
+            kwargs={"sheet_date": balance_sheet.date.strftime("%Y-%m-%d")},
+        )
+
+        checking = balance_sheet.accounts.get(name="Everyday Checkings")
+        valid = {
+            "date": balance_sheet.date.strftime("%Y-%m-%d"),
+            "credit": checking.get_api_url(),
+            "debit": checking.get_api_url(),
+            "amount": "10.00",
+        }
+        invalid = {**valid, "debit": "/api/accounts/99999/"}
+
+        # No transactions are created if any of the transactions are invalid
+        rep = admin_client.post(url, [valid, invalid], format="json")
+        assert rep.status_code == status.HTTP_400_BAD_REQUEST
+        assert "debit" in rep.json()[1]
+        assert balance_sheet.transactions.count() == 11
+
+        rep = admin_client.post(url, valid, format="json")
+        assert rep.status_code == status.HTTP_400_BAD_REQUEST
+
+        url = reverse(
+            "sheets-api:sheet-transactions-batch", kwargs={"sheet_date": "2019-10-14"}
+        )
+        rep = admin_client.post(url, [valid], format="json")
+        assert rep.status_code == status.HTTP_404_NOT_FOUND
+
 
 ##########################################################################
 ## Test Payments API View
@@ -475,6 +770,61 @@ class TestPaymentsAPIView(object):
         TransactionFactory.create(**data)
 
 
+##########################################################################
+## Test Credit Score API
+##########################################################################
+
+class TestCreditScoreAPI(object):
+
+    @pytest.fixture()
+    def scores(self, db):
+        return [
+            CreditScoreFactory(source=CreditScore.EXPERIAN, score=score, date=this_month() - relativedelta(months=n))
+            for n, score in enumerate([710, 700, 700, 720])
+        ]
+
+    def test_list_trend(self, admin_client, scores, django_assert_num_queries):
+        """
+        The trend and delta of every listed score come from the list query
+        """
+        with django_assert_num_queries(3):
+            rep = admin_client.get(reverse("api:creditscores-list"))
+        assert rep.status_code == status.HTTP_200_OK
+
+        data = rep.json()
+        assert [item["score"] for item in data] == [710, 700, 700, 720]
+        assert [item["trend"] for item in data] == ["up", "flat", "down", "flat"]
+        assert [item["delta"] for item in data] == [10, 0, -20, None]
+
+    def test_list_trend_unpreferred(self, admin_client, scores):
+        """
+        Listed scores are compared with the previous score, even if it is not listed
+        """
+        scores[1].score = 690
+        scores[1].preferred = False
+        scores[1].save()
+
+        data = admin_client.get(reverse("api:creditscores-list")).json()
+        assert [item["score"] for item in data] == [710, 700, 720]
+        assert [item["delta"] for item in data] == [20, -20, None]
+
+        # The listed scores agree with their detail
+        for item in data:
+            assert admin_client.get(item["url"]).json()["delta"] == item["delta"]
+
+    def test_detail_trend(self, admin_client, scores):
+        """
+        A single score reports its trend from the previous score
+        """
+        url = reverse("api:creditscores-detail", kwargs={"pk": scores[0].pk})
+        rep = admin_client.get(url)
+        assert rep.status_code == status.HTTP_200_OK
+
+        data = rep.json()
+        assert data["trend"] == "up"
+        assert data["delta"] == 10
+
+
 ##########################################################################
 ## Test Status Endpoint
 ##########################################################################
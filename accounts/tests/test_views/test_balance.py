@@ -0,0 +1,131 @@
+# accounts.tests.test_views.test_balance
+# Tests for the balance sheet HTML views.
+#
+# Author:  Benjamin Bengfort <benjamin@bengfort.com>
+# Created: Sun Oct 18 17:48:22 2026 -0400
+#
+# ID: test_balance.py [] benjamin@bengfort.com $
+
+"""
+Tests for the balance sheet HTML views.
+"""
+
+##########################################################################
+## Imports
+##########################################################################
+
+import pytest
+
+from datetime import date
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ..factories import BalanceSheetFactory, BalanceFactory, TransactionFactory
+from ..factories import CreditCardFactory, BillingAccountFactory
+
+# All tests in this module use the database
+pytestmark = pytest.mark.django_db
+
+
+def sheet_url(sheet, **params):
+    url = sheet.get_absolute_url()
+    if params:
+        url += "?" + "&".join(f"{key}={value}" for key, value in params.items())
+    return url
+
+
+##########################################################################
+## Balance Sheet View Tests
+##########################################################################
+
+@pytest.mark.parametrize("params", [{}, {"print": 1}])
+def test_balance_sheet_view(admin_client, balance_sheet, params):
+    """
+    The balance sheet renders the balances grouped by account type
+    """
+    rep = admin_client.get(sheet_url(balance_sheet, **params))
+    assert rep.status_code == 200
+
+    balances = rep.context["balances"]
+    assert balances["cash"].count == 2
+    assert balances["credit"].count == 2
+    assert balances["investment"].count == 0
+    assert b"Mileage Visa" in rep.content
+    assert b"No loan account balances." in rep.content
+
+    transactions = rep.context["transactions"]
+    assert transactions.count == 11
+    assert b"11 transactions from" in rep.content
+
+
+@pytest.mark.parametrize("params", [{}, {"print": 1}])
+def test_balance_sheet_view_queries(admin_client, balance_sheet, params):
+    """
+    The number of queries to render a balance sheet does not grow with its balances
+    or transactions
+    """
+    url = sheet_url(balance_sheet, **params)
+    with CaptureQueriesContext(connection) as queries:
+        assert admin_client.get(url).status_code == 200
+
+    for n in range(5):
+        card = CreditCardFactory(name=f"Card {n}")
+        BalanceFactory(sheet=balance_sheet, account=card)
+        TransactionFactory(sheet=balance_sheet, credit=card, debit=BillingAccountFactory(name=f"Bill {n}"))
+
+    with CaptureQueriesContext(connection) as more_queries:
+        rep = admin_client.get(url)
+
+    assert rep.context["balances"]["credit"].count == 7
+    assert rep.context["transactions"].count == 16
+    assert len(more_queries) == len(queries)
+
+
+def test_edit_balance_sheet_view(admin_client, balance_sheet):
+    """
+    The edit page does not load the balances and transactions it does not render
+    """
+    url = reverse("sheets-edit", kwargs={
+        "year": balance_sheet.date.year, "month": balance_sheet.date.month,
+    })
+
+    with CaptureQueriesContext(connection) as queries:
+        rep = admin_client.get(url)
+    assert rep.status_code == 200
+    assert "balances" not in rep.context
+    assert "transactions" not in rep.context
+    assert not [query for query in queries if 'FROM "balances"' in query["sql"]]
+    assert not [query for query in queries if 'FROM "transactions"' in query["sql"]]
+
+    # The print template of the edit page still renders the balance tables
+    rep = admin_client.get(url + "?print=1")
+    assert rep.context["balances"]["cash"].count == 2
+    assert rep.context["transactions"].count == 11
+
+
+##########################################################################
+## Balance Sheet Archive Tests
+##########################################################################
+
+def test_balance_sheet_archives(admin_client, django_assert_num_queries):
+    """
+    The archive groups the sheets by year with a constant number of queries
+    """
+    for year in range(2005, 2021):
+        for month in (1, 6, 11):
+            BalanceSheetFactory(date=date(year, month, 1))
+
+    # Session, user, date list, and sheets
+    with django_assert_num_queries(4):
+        rep = admin_client.get(reverse("sheets-archive"))
+    assert rep.status_code == 200
+
+    years = rep.context["years"]
+    assert list(years) == list(range(2020, 2004, -1))
+    for year, sheets in years.items():
+        assert [sheet.date for sheet in sheets] == [
+            date(year, month, 1) for month in (11, 6, 1)
+        ]
+
+    assert b'datetime="2012-06-01"' in rep.content
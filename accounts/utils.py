@@ -15,6 +15,11 @@ Helpers and utilities for the accounts app
 ##########################################################################
 
 from enum import Enum
+from datetime import date
+from dateutil.relativedelta import relativedelta
+
+from django.conf import settings
+from django.db.models import Func, DateField
 
 
 ##########################################################################
@@ -47,3 +52,35 @@ class Currency(Enum):
             "JPY": "¥",
             "MXN": "$",
         }[self.value]
+
+
+##########################################################################
+## Billing Month
+##########################################################################
+
+def billing_month(today=None):
+    """
+    Returns the date of the month currently being worked on: this month until the
+    billing day of the month has passed, then the first of next month.
+    """
+    if today is None:
+        today = date.today()
+
+    if today.day <= settings.BILLING_DAY_OF_MONTH:
+        return today
+    return (today + relativedelta(months=1)).replace(day=1)
+
+
+##########################################################################
+## Database Functions
+##########################################################################
+
+class MonthStart(Func):
+    """
+    Truncates a date to the first day of its month. Unlike TruncMonth on a date
+    (which is implicitly cast to a timestamp with time zone) the expression is
+    immutable, so it can be used in indexes and constraints.
+    """
+
+    template = "DATE_TRUNC('month', %(expressions)s::timestamp)::date"
+    output_field = DateField()
@@ -14,8 +14,12 @@ API ViewSets and controllers
 ## Imports
 ##########################################################################
 
-from django.db import connection
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Sum, Prefetch, prefetch_related_objects
 
+from .. import analytics
+from ..analytics import Series, TimeSeries
+from ..balances import deferred_balances
 from ..models import Account, Payment, CreditScore
 from ..models import BalanceSheet, Balance, Transaction
 from ..serializers import BalanceSerializer
@@ -24,7 +28,9 @@ from ..serializers import PaymentSerializer
 from ..serializers import CreditScoreSerializer
 from ..serializers import BalanceSheetDetailSerializer
 from ..serializers import BalanceSheetSummarySerializer
+from ..serializers import BalanceBeginningSerializer
 from ..serializers import BalanceDetailSerializer, BalanceSummarySerializer
+from ..serializers import TransactionBatchSerializer
 from ..serializers import TransactionSerializer, TransactionSummarySerializer
 
 from rest_framework import status
@@ -32,22 +38,55 @@ from rest_framework import viewsets
 from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 
 
 __all__ = [
     "AccountViewSet", "BalanceSheetViewSet",
     "BalanceViewSet", "TransactionViewSet",
     "CreditScoreViewSet",
-    "PaymentsAPIView", "CashFlow", "MonthlySavings", "Investments",
+    "PaymentsAPIView", "TimeSeriesViewSet", "CashFlow", "MonthlySavings", "Investments",
 ]
 
 
+##########################################################################
+## Related Object Policies
+##########################################################################
+
+class RelatedPolicyMixin(object):
+    """
+    Applies the select_related and prefetch_related policies of the viewset to its
+    queryset so that the related objects its serializers touch for each row (e.g.
+    the bank in the string representation of an account) are fetched with the rows
+    instead of with a query per row. The policies map the action to the relations
+    to select or prefetch; the "*" key applies to any action not listed.
+    """
+
+    select_related_policy = {}
+    prefetch_related_policy = {}
+
+    def get_related_policy(self, policy):
+        return policy.get(self.action, policy.get("*", ()))
+
+    def get_queryset(self):
+        queryset = super(RelatedPolicyMixin, self).get_queryset()
+
+        select_related = self.get_related_policy(self.select_related_policy)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+        prefetch_related = self.get_related_policy(self.prefetch_related_policy)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+
+        return queryset
+
+
 ##########################################################################
 ## Basic Resources
 ##########################################################################
 
-class AccountViewSet(viewsets.ReadOnlyModelViewSet):
+class AccountViewSet(RelatedPolicyMixin, viewsets.ReadOnlyModelViewSet):
     """
     Display account and bank information
     """
@@ -55,6 +94,7 @@ class AccountViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Account.objects.filter(active=True)
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAdminUser]
+    select_related_policy = {"*": ("bank",)}
 
 
 class CreditScoreViewSet(viewsets.ReadOnlyModelViewSet):
@@ -62,15 +102,22 @@ class CreditScoreViewSet(viewsets.ReadOnlyModelViewSet):
     Display credit score history
     """
 
-    queryset = CreditScore.objects.filter(preferred=True).order_by("-date")[:20]
+    queryset = CreditScore.objects.filter(preferred=True)
     serializer_class = CreditScoreSerializer
 
+    def get_queryset(self):
+        # The trend of each listed score is computed in the list query over all of
+        # the scores; a detail query falls back to querying the previous score.
+        if self.action == "list":
+            return CreditScore.objects.preferred_with_trend().order_by("-date")[:20]
+        return super(CreditScoreViewSet, self).get_queryset()
+
 
 ##########################################################################
 ## BalanceSheet Base Resource
 ##########################################################################
 
-class BalanceSheetViewSet(viewsets.ModelViewSet):
+class BalanceSheetViewSet(RelatedPolicyMixin, viewsets.ModelViewSet):
     """
     Most viewsets are nested under their associated balance sheet.
     """
@@ -79,6 +126,26 @@ class BalanceSheetViewSet(viewsets.ModelViewSet):
     lookup_field = 'date'
     permission_classes = [permissions.IsAdminUser]
 
+    # The detail serializer includes the balances (with account names) and the
+    # transactions (with account links) of the sheet.
+    prefetch_related_policy = {
+        action: (
+            Prefetch("balances", queryset=Balance.objects.select_related("account__bank")),
+            "transactions",
+        )
+        for action in ("retrieve", "update", "partial_update")
+    }
+
+    def get_queryset(self):
+        """
+        Annotates the transaction and account counts for the sheet summaries so that
+        the list runs a constant number of queries regardless of the number of sheets.
+        """
+        queryset = super(BalanceSheetViewSet, self).get_queryset()
+        if self.action == "list":
+            queryset = queryset.with_summary_counts()
+        return queryset
+
     def get_serializer_class(self):
         """
         Returns list or detail balance sheet serializers
@@ -87,6 +154,20 @@ class BalanceSheetViewSet(viewsets.ModelViewSet):
             return BalanceSheetSummarySerializer
         return BalanceSheetDetailSerializer
 
+    @action(detail=True, methods=["post"])
+    def refresh(self, request, date=None):
+        """
+        Recomputes the ending balances of all accounts on the sheet.
+        """
+        sheet = self.get_object()
+        sheet.recompute_balances()
+
+        # Prefetch the recomputed balances for the detail serializer
+        prefetch_related_objects([sheet], *self.prefetch_related_policy["retrieve"])
+
+        serializer = self.get_serializer(sheet)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 ##########################################################################
 ## Balance Sheet Nested Resources
@@ -105,22 +186,35 @@ class BalanceSheetNestedResource(viewsets.ModelViewSet):
 
         return self.model_class
 
+    def get_sheet(self):
+        """
+        Returns the balance sheet the resource is nested under, which is fetched once
+        per request and cached on the view, raising NotFound if it does not exist.
+        """
+        if not hasattr(self, "_sheet"):
+            sheet_date = self.kwargs['sheet_date']
+            try:
+                self._sheet = BalanceSheet.objects.get(date=sheet_date)
+            except (BalanceSheet.DoesNotExist, DjangoValidationError):
+                raise NotFound("balance sheet for {} not found".format(sheet_date))
+        return self._sheet
+
     def get_queryset(self):
-        sheet_date = self.kwargs['sheet_date']
-        if not BalanceSheet.objects.filter(date=sheet_date).exists():
-            raise NotFound("balance sheet for {} not found".format(sheet_date))
-        return self.get_model_class().objects.filter(sheet__date=sheet_date)
+        return self.get_model_class().objects.filter(sheet_id=self.get_sheet().id)
+
+    def get_object(self):
+        # Use the resolved sheet rather than fetching it again from the object
+        obj = super(BalanceSheetNestedResource, self).get_object()
+        obj.sheet = self.get_sheet()
+        return obj
+
+    def perform_create(self, serializer):
+        serializer.save(sheet=self.get_sheet())
 
     def create(self, request, sheet_date=None):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-
-        try:
-            sheet = BalanceSheet.objects.get(date=sheet_date)
-        except BalanceSheet.DoesNotExist:
-            raise NotFound("balance sheet for {} not found".format(sheet_date))
-
-        serializer.save(sheet=sheet)
+        self.perform_create(serializer)
 
         return Response(
             serializer.data,
@@ -129,7 +223,7 @@ class BalanceSheetNestedResource(viewsets.ModelViewSet):
         )
 
 
-class BalanceViewSet(BalanceSheetNestedResource):
+class BalanceViewSet(RelatedPolicyMixin, BalanceSheetNestedResource):
     """
     Account balances associated with a balance sheet
     """
@@ -137,6 +231,13 @@ class BalanceViewSet(BalanceSheetNestedResource):
     model_class = Balance
     permission_classes = [permissions.IsAdminUser]
 
+    # The summary and detail serializers name the account (including its bank); the
+    # detail serializer loads the transactions and totals with a single query.
+    select_related_policy = {
+        action: ("account__bank",)
+        for action in ("list", "retrieve", "partial_update", "refresh")
+    }
+
     def get_serializer_class(self):
         """
         Returns the correct balance serializer based on the action
@@ -145,8 +246,50 @@ class BalanceViewSet(BalanceSheetNestedResource):
             return BalanceSummarySerializer
         elif self.action in {"create", "update"}:
             return BalanceSerializer
+        elif self.action == "bulk_update":
+            return BalanceBeginningSerializer
         return BalanceDetailSerializer
 
+    def bulk_update(self, request, sheet_date=None):
+        """
+        Sets the beginning balance of the balances on the sheet identified by id or
+        account with a single bulk update and ending balance recompute, returning a
+        summary of the update rather than the detail of every balance.
+        """
+        sheet = self.get_sheet()
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        balances = list(sheet.balances.all())
+        by_id = {balance.id: balance for balance in balances}
+        by_account = {balance.account_id: balance for balance in balances}
+
+        updated, errors = {}, []
+        for item in serializer.validated_data:
+            if "id" in item:
+                balance = by_id.get(item["id"])
+            else:
+                balance = by_account.get(item["account"].id)
+
+            if balance is None:
+                errors.append({"non_field_errors": ["balance not found on the sheet"]})
+                continue
+
+            errors.append({})
+            balance.beginning = item["beginning"]
+            updated[balance.id] = balance
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        Balance.objects.bulk_update(updated.values(), ["beginning"])
+        totals = sheet.balances.filter(id__in=list(updated)).aggregate(
+            beginning=Sum("beginning"), ending=Sum("ending"),
+        )
+
+        data = {"sheet": sheet.date, "updated": len(updated), **totals}
+        return Response(data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"])
     def refresh(self, request, sheet_date=None, pk=None):
         balance = self.get_object()
@@ -161,7 +304,7 @@ class BalanceViewSet(BalanceSheetNestedResource):
         )
 
 
-class TransactionViewSet(BalanceSheetNestedResource):
+class TransactionViewSet(RelatedPolicyMixin, BalanceSheetNestedResource):
     """
     Transactions associated with a balance sheet
     """
@@ -170,6 +313,12 @@ class TransactionViewSet(BalanceSheetNestedResource):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    # The summary serializer names the credit and debit accounts (including banks)
+    select_related_policy = {
+        action: ("credit__bank", "debit__bank")
+        for action in ("list", "retrieve", "partial_update")
+    }
+
     def get_serializer_class(self):
         """
         Returns the correct transaction serializer based on the action
@@ -178,8 +327,40 @@ class TransactionViewSet(BalanceSheetNestedResource):
             return TransactionSerializer
         return TransactionSummarySerializer
 
+    # The ending balances touched by a write are recomputed once when it commits
+    def perform_create(self, serializer):
+        with deferred_balances():
+            super(TransactionViewSet, self).perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with deferred_balances():
+            super(TransactionViewSet, self).perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with deferred_balances():
+            super(TransactionViewSet, self).perform_destroy(instance)
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request, sheet_date=None):
+        """
+        Creates a list of transactions on the sheet in a single database transaction,
+        validating the accounts with one query and recomputing each affected balance
+        once rather than once per transaction.
+        """
+        sheet = self.get_sheet()
+        serializer = TransactionBatchSerializer(
+            child=TransactionSerializer(),
+            data=request.data,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        with deferred_balances():
+            serializer.save(sheet=sheet)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
-class PaymentsAPIView(viewsets.ModelViewSet):
+class PaymentsAPIView(RelatedPolicyMixin, viewsets.ModelViewSet):
     """
     Programmatically interact with payments and create transactions from them.
     """
@@ -188,6 +369,9 @@ class PaymentsAPIView(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    # Payments are described by their credit and debit accounts (including banks)
+    select_related_policy = {"*": ("credit__bank", "debit__bank")}
+
     @action(detail=True, methods=["get"])
     def transaction(self, request, pk=None):
         payment = self.get_object()
@@ -201,119 +385,65 @@ class PaymentsAPIView(viewsets.ModelViewSet):
 ## Data Views for Visualizations
 ##########################################################################
 
-class CashFlow(viewsets.ViewSet):
+class TimeSeriesViewSet(viewsets.ViewSet):
     """
-    Provides a cash vs. credit card debt listing for the past 6 months.
+    Lists the time series described by the series of the viewset for the most
+    recent balance sheets (limited by the window), most recent first.
     """
 
-    # TODO: move this to a SQL file that can be loaded on demand
-    QUERY = (
-        "WITH sheet_balances AS ("
-        "	SELECT b.beginning, b.ending, s.id AS sheet_id, s.date, a.type FROM balances b"
-        "		JOIN balance_sheets s ON b.sheet_id = s.id"
-        "		JOIN accounts a ON b.account_id = a.id"
-        "     WHERE a.active = 't' AND a.exclude = 'f'"
-        "	ORDER BY s.date DESC"
-        "), cash AS ("
-        "	SELECT SUM(beginning) as beginning, SUM(ending) as ending, date FROM sheet_balances WHERE type = 'Ca' GROUP BY date"
-        "), debt AS ("
-        "	SELECT SUM(beginning) as beginning, SUM(ending) as ending, date FROM sheet_balances WHERE type = 'Cc' GROUP BY date"
-        ")"
-
-        "SELECT cash.date, cash.beginning AS cash_beginning, debt.beginning AS debt_beginning, "
-        "	cash.ending AS cash_ending, debt.ending AS debt_ending, "
-        "	cash.ending-cash.beginning AS cash_change, debt.ending-debt.beginning AS debt_change,"
-        "	cash.beginning + debt.beginning AS net_beginning, cash.ending + debt.ending AS net_ending,"
-        "	((cash.beginning+debt.beginning) - (cash.ending+debt.ending)) AS net_change"
-        " FROM cash JOIN debt ON cash.date=debt.date"
-        " ORDER BY cash.date DESC"
-        " LIMIT 6"
-    )
+    series = ()
+    window = 12
 
     def list(self, request):
-        """
-        Prepare the response for the past 6 months.
-        """
-        with connection.cursor() as cursor:
-            # Execute the large query
-            cursor.execute(self.QUERY)
-            columns = [col[0] for col in cursor.description]
+        return Response(TimeSeries(self.series, window=self.window).results())
 
-            data = [dict(zip(columns, row)) for row in cursor.fetchall()]
-            return Response(data)
 
+class CashFlow(TimeSeriesViewSet):
+    """
+    Provides a cash vs. credit card debt listing for the past 6 months.
+    """
 
-class MonthlySavings(viewsets.ViewSet):
+    window = 6
+    series = [
+        Series("cash_beginning", Account.CASH, metric=analytics.BEGINNING),
+        Series("debt_beginning", Account.CREDIT, metric=analytics.BEGINNING),
+        Series("cash_ending", Account.CASH, metric=analytics.ENDING),
+        Series("debt_ending", Account.CREDIT, metric=analytics.ENDING),
+        Series("cash_change", Account.CASH, metric=analytics.CHANGE),
+        Series("debt_change", Account.CREDIT, metric=analytics.CHANGE),
+        Series("net_beginning", (Account.CASH, Account.CREDIT), metric=analytics.BEGINNING),
+        Series("net_ending", (Account.CASH, Account.CREDIT), metric=analytics.ENDING),
+        Series("net_change", (Account.CASH, Account.CREDIT), metric=analytics.CHANGE),
+    ]
+
+
+class MonthlySavings(TimeSeriesViewSet):
     """
     Provides a view on how much money is being saved each month by computing the
     difference between each balance sheet's ending net cash.
     """
 
-    # TODO: move this to a SQL file that can be loaded on demand
-    QUERY = (
-        "WITH cash_ending_balances AS ("
-        "    SELECT s.date, a.type, b.ending as ending_balance FROM balances b"
-        "        JOIN balance_sheets s ON b.sheet_id = s.id"
-        "        JOIN accounts a ON b.account_id = a.id"
-        "    WHERE a.active = 't' AND a.exclude = 'f' AND a.type = 'Ca'"
-        "), ending_cash AS ("
-        "    SELECT date, sum(ending_balance) as ending_cash FROM cash_ending_balances"
-        "        GROUP BY date"
-        "        ORDER BY date DESC"
-        "        LIMIT 13"
-        ") "
-        "SELECT date, ending_cash, ending_cash - lag(ending_cash) over (order by date) as savings"
-        "    FROM ending_cash"
-        "    ORDER BY date DESC"
-    )
-
-    def list(self, request):
-        """
-        Prepare the response for the past 18 months.
-        """
-        with connection.cursor() as cursor:
-            # Execute the large query
-            cursor.execute(self.QUERY)
-            columns = [col[0] for col in cursor.description]
-
-            # Trim the last row since it won't have a savings computation from the lag window
-            data = [dict(zip(columns, row)) for row in cursor.fetchall()][:-1]
-            return Response(data)
+    window = 12
+    series = [
+        Series("ending_cash", Account.CASH, metric=analytics.ENDING),
+        Series(
+            "savings", Account.CASH, metric=analytics.ENDING,
+            comparison=analytics.DIFFERENCE,
+        ),
+    ]
 
 
-class Investments(viewsets.ViewSet):
+class Investments(TimeSeriesViewSet):
     """
     Provides a view on how how our investments and retirement accounts are growing over
-    time and the percent change from the previous month.
+    time and the percent of the previous month.
     """
 
-    # TODO: move this to a SQL file that can be loaded on demand
-    QUERY = (
-        "WITH investment_ending_balances AS ("
-        "    SELECT s.date, a.type, b.ending as ending_balance FROM balances b"
-        "        JOIN balance_sheets s ON b.sheet_id = s.id"
-        "        JOIN accounts a ON b.account_id = a.id"
-        "    WHERE a.active = 't' AND a.exclude = 'f' AND a.type = 'Iv'"
-        "), ending_investment AS ("
-        "    SELECT date, sum(ending_balance) as investment FROM investment_ending_balances"
-        "        GROUP BY date"
-        "        ORDER BY date DESC"
-        "        LIMIT 19"
-        ") "
-        "SELECT date, investment, (investment / lag(investment) over (order by date))*100 as percent_change"
-        "    FROM ending_investment"
-        "    ORDER BY date DESC"
-    )
-
-    def list(self, request):
-        """
-        Prepare the response for the past 18 months.
-        """
-        with connection.cursor() as cursor:
-            # Execute the large query
-            cursor.execute(self.QUERY)
-            columns = [col[0] for col in cursor.description]
-
-            # Trim the last row since it won't have a savings computation from the lag window
-            data = [dict(zip(columns, row)) for row in cursor.fetchall()][:-1]
-            return Response(data)
+    window = 18
+    series = [
+        Series("investment", Account.INVESTMENT, metric=analytics.ENDING),
+        Series(
+            "percent_change", Account.INVESTMENT, metric=analytics.ENDING,
+            comparison=analytics.PERCENT,
+        ),
+    ]
@@ -16,6 +16,7 @@ Balance sheet related views (HTML)
 
 from ..models import BalanceSheet
 from ..models import Account, Payment
+from ..summary import balance_groups, transaction_summary
 
 from django.http import Http404
 from django.views.generic import DetailView
@@ -44,15 +45,18 @@ class BalanceSheetArchives(LoginRequiredMixin, ArchiveIndexView):
     template_name = "balance_sheet_archive.html"
     context_object_name = "sheets"
 
+    def get_queryset(self):
+        # The archive only renders the date of each sheet
+        return super(BalanceSheetArchives, self).get_queryset().only("id", "date")
+
     def get_context_data(self, **kwargs):
         context = super(BalanceSheetArchives, self).get_context_data(**kwargs)
         context['dashboard'] = 'sheets'
 
-        # Create a hierarchical index of sheets
-        context["years"] = {
-            dt.year: context['sheets'].filter(date__year=dt.year)
-            for dt in context['date_list']
-        }
+        # Create a hierarchical index of sheets from a single query
+        context["years"] = {dt.year: [] for dt in context['date_list']}
+        for sheet in context['sheets']:
+            context["years"][sheet.date.year].append(sheet)
 
         return context
 
@@ -64,6 +68,11 @@ class BalanceSheetView(LoginRequiredMixin, DetailView):
     print_template_name = "balance_sheet_print.html"
     context_object_name = "sheet"
 
+    # Group the balances by account type for the balance tables and summarize the
+    # transactions for the transactions table
+    group_balances = True
+    summarize_transactions = True
+
     def get_object(self, queryset=None):
         """
         Returns the balance sheet by date.
@@ -83,16 +92,19 @@ class BalanceSheetView(LoginRequiredMixin, DetailView):
         try:
             # Get the single item from the filtered queryset
             obj = queryset.get_month(year, month)
-        except queryset.model.DoesNotExist:
+        except (queryset.model.DoesNotExist, ValueError):
             raise Http404(_("No %(verbose_name)s found matching the query") %
                           {'verbose_name': queryset.model._meta.verbose_name})
         return obj
 
+    def is_print(self):
+        return bool(self.request.GET.get('print', False))
+
     def get_template_names(self):
         """
         Returns the print template name if print query, otherwise returns super.
         """
-        if self.request.GET.get('print', False):
+        if self.is_print():
             return [self.print_template_name]
         return super(BalanceSheetView, self).get_template_names()
 
@@ -102,6 +114,13 @@ class BalanceSheetView(LoginRequiredMixin, DetailView):
         """
         context = super(BalanceSheetView, self).get_context_data(**kwargs)
         context['dashboard'] = 'sheets'
+
+        if self.group_balances or self.is_print():
+            context['balances'] = balance_groups(self.object)
+
+        if self.summarize_transactions or self.is_print():
+            context['transactions'] = transaction_summary(self.object)
+
         return context
 
 
@@ -110,6 +129,10 @@ class EditBalanceSheet(BalanceSheetView):
     model = BalanceSheet
     template_name = "balance_sheet_edit.html"
 
+    # The edit forms do not render the tables (only the print template does)
+    group_balances = False
+    summarize_transactions = False
+
     def get_context_data(self, **kwargs):
         """
         Context data to populate form selections and other elements.
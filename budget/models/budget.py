@@ -21,6 +21,51 @@ from datetime import date
 from decimal import Decimal
 from django.db import models
 from django.urls import reverse
+from django.db.models import F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, Lag
+
+
+class BudgetQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotates each budget with income_total and expense_total, the yearly totals
+        (amount times frequency) of its income and expense line items, or zero if it
+        has none. The totals are grouped over a join to the line items, so do not
+        combine them with other annotations over multi-valued relations.
+        """
+        amount = models.DecimalField(max_digits=16, decimal_places=2)
+        total = F("line_items__amount") * F("line_items__frequency")
+
+        return self.annotate(
+            income_total=Coalesce(
+                Sum(total, filter=Q(line_items__is_income=True), output_field=amount),
+                Value(0), output_field=amount,
+            ),
+            expense_total=Coalesce(
+                Sum(total, filter=Q(line_items__is_income=False), output_field=amount),
+                Value(0), output_field=amount,
+            ),
+        )
+
+    def with_changes(self):
+        """
+        Annotates each budget with its totals (see with_totals), savings_total, and
+        the change in each total from the previous budget by year as income_change,
+        expense_change, and savings_change. The previous budget is the one before it
+        in the queryset, which may not be the year before; the first has no change.
+        """
+        queryset = self.with_totals().annotate(
+            savings_total=F("income_total") - F("expense_total"),
+        )
+
+        changes = {}
+        for total in ("income", "expense", "savings"):
+            field = f"{total}_total"
+            changes[f"{total}_change"] = F(field) - Window(
+                expression=Lag(field), order_by=F("year").asc(),
+            )
+        return queryset.annotate(**changes)
 
 
 class Budget(models.Model):
@@ -47,14 +92,31 @@ class Budget(models.Model):
         ordering = ("-year",)
         get_latest_by = "year"
 
+    objects = BudgetQuerySet.as_manager()
+
     def get_absolute_url(self):
         kwargs = {'year': self.year}
         return reverse('budget-detail', kwargs=kwargs)
 
+    def _prefetched_line_items(self, is_income):
+        """
+        Returns the income or expense line items from the prefetched line items, or
+        None if the line items have not been prefetched.
+        """
+        items = getattr(self, "_prefetched_objects_cache", {}).get("line_items")
+        if items is None:
+            return None
+        return [item for item in items if item.is_income == is_income]
+
     def income_items(self):
+        items = self._prefetched_line_items(True)
+        if items is not None:
+            return items
         return self.line_items.filter(is_income=True)
 
     def total_income(self):
+        if hasattr(self, "income_total"):
+            return self.income_total
         return sum(item.total for item in self.income_items())
 
     def monthly_income(self):
@@ -62,9 +124,14 @@ class Budget(models.Model):
         return round(amt, 2)
 
     def expense_items(self):
+        items = self._prefetched_line_items(False)
+        if items is not None:
+            return items
         return self.line_items.filter(is_income=False)
 
     def total_expenses(self):
+        if hasattr(self, "expense_total"):
+            return self.expense_total
         return sum(item.total for item in self.expense_items())
 
     def monthly_expenses(self):
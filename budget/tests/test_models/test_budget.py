@@ -19,6 +19,9 @@ Model tests for the budget app.
 
 import pytest
 
+from decimal import Decimal
+from budget.models import Budget
+
 from ..factories import *
 
 # All tests in this module use the database
@@ -35,3 +38,87 @@ def test_empty_budget():
     assert b.monthly_expenses() == 0
     assert b.monthly_savings() == 0
     assert b.total_savings() == 0
+
+
+@pytest.fixture()
+def budget(db):
+    budget = BudgetFactory(year=2019)
+    items = [
+        ("Salary", "4000.00", 12, True),
+        ("Bonus", "5000.00", 1, True),
+        ("Rent", "1500.00", 12, False),
+        ("Groceries", "150.00", 52, False),
+        ("Insurance", "300.00", 4, False),
+    ]
+
+    for name, amount, frequency, is_income in items:
+        LineItemFactory(
+            budget=budget, name=name, amount=Decimal(amount),
+            frequency=frequency, is_income=is_income,
+        )
+    return budget
+
+
+def test_budget_totals(budget):
+    assert budget.total_income() == Decimal("53000.00")
+    assert budget.total_expenses() == Decimal("27000.00")
+    assert budget.monthly_income() == Decimal("4416.67")
+    assert budget.monthly_expenses() == Decimal("2250.00")
+    assert budget.monthly_savings() == Decimal("2166.67")
+    assert budget.total_savings() == Decimal("26000.00")
+
+
+def test_with_totals(budget, django_assert_num_queries):
+    """
+    Budget totals are annotated in the same query as the budget
+    """
+    BudgetFactory(year=2020)
+    methods = (
+        "total_income", "monthly_income", "total_expenses",
+        "monthly_expenses", "monthly_savings", "total_savings",
+    )
+    expected = [getattr(budget, method)() for method in methods]
+
+    with django_assert_num_queries(1):
+        budgets = {b.year: b for b in Budget.objects.with_totals()}
+        assert [getattr(budgets[2019], method)() for method in methods] == expected
+
+    assert budgets[2020].total_income() == 0
+    assert budgets[2020].total_savings() == 0
+
+
+def test_prefetched_line_items(budget, django_assert_num_queries):
+    """
+    Prefetched line items are split into income and expenses in memory
+    """
+    with django_assert_num_queries(2):
+        budget = Budget.objects.with_totals().prefetch_related("line_items").get(year=2019)
+
+    with django_assert_num_queries(0):
+        assert {item.name for item in budget.income_items()} == {"Salary", "Bonus"}
+        assert len(budget.expense_items()) == 3
+        assert budget.total_savings() == Decimal("26000.00")
+
+
+def test_with_changes(budget, django_assert_num_queries):
+    """
+    Budget over budget changes are computed in the same query as the totals
+    """
+    BudgetFactory(year=2018)
+    later = BudgetFactory(year=2020)
+    LineItemFactory(budget=later, name="Salary", amount=Decimal("5000.00"), is_income=True)
+
+    with django_assert_num_queries(1):
+        budgets = {b.year: b for b in Budget.objects.with_changes()}
+
+    assert budgets[2018].income_change is None
+    assert budgets[2018].savings_total == 0
+
+    assert budgets[2019].income_change == Decimal("53000.00")
+    assert budgets[2019].expense_change == Decimal("27000.00")
+    assert budgets[2019].savings_change == Decimal("26000.00")
+
+    assert budgets[2020].income_change == Decimal("7000.00")
+    assert budgets[2020].expense_change == Decimal("-27000.00")
+    assert budgets[2020].savings_total == Decimal("60000.00")
+    assert budgets[2020].savings_change == Decimal("34000.00")
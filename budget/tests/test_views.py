@@ -17,7 +17,9 @@ Test the budget views module
 ## Imports
 ##########################################################################
 
-from .factories import BudgetFactory
+from django.urls import reverse
+
+from .factories import BudgetFactory, LineItemFactory
 
 
 def test_no_budget(admin_client):
@@ -40,3 +42,42 @@ def test_latest_budget(admin_client):
     assert response.status_code == 302
     assert response.url != prev_budget.get_absolute_url()
     assert response.url == budget.get_absolute_url()
+
+
+def test_budget_dashboard_queries(admin_client, django_assert_num_queries):
+    """
+    The budget dashboard loads the budget totals and line items in two queries.
+    """
+    budget = BudgetFactory(year=2019)
+    for n in range(6):
+        LineItemFactory(budget=budget, name=f"Item {n}", amount=100, is_income=n % 3 == 0)
+
+    # Session, user, budget with totals, and line items
+    with django_assert_num_queries(4):
+        response = admin_client.get(budget.get_absolute_url())
+
+    assert response.status_code == 200
+    assert response.context["budget"].total_income() == 2400
+    assert response.context["budget"].total_expenses() == 4800
+
+
+def test_budget_archive_queries(admin_client, django_assert_num_queries):
+    """
+    The budget archive loads every year's totals and changes in a single query.
+    """
+    for year in range(2005, 2021):
+        budget = BudgetFactory(year=year)
+        LineItemFactory(budget=budget, name="Salary", amount=year, is_income=True)
+        LineItemFactory(budget=budget, name="Rent", amount=1000)
+
+    # Session, user, and budgets with totals
+    with django_assert_num_queries(3):
+        response = admin_client.get(reverse("budget-archive"))
+
+    assert response.status_code == 200
+
+    budgets = response.context["budgets"]
+    assert [budget.year for budget in budgets] == list(range(2020, 2004, -1))
+    assert budgets[0].savings_total == (2020 - 1000) * 12
+    assert budgets[0].savings_change == 12
+    assert budgets[15].savings_change is None
@@ -72,7 +72,7 @@ class BudgetDashboard(LoginRequiredMixin, DetailView):
 
         try:
             # Get the single item from the filtered queryset
-            obj = queryset.prefetch_related().get(year=year)
+            obj = queryset.with_totals().prefetch_related("line_items").get(year=year)
         except queryset.model.DoesNotExist:
             verbose_name = queryset.model._meta.verbose_name
             raise Http404(_("No {} found matching the query").format(verbose_name))
@@ -88,9 +88,14 @@ class BudgetDashboard(LoginRequiredMixin, DetailView):
 class BudgetArchives(LoginRequiredMixin, ListView):
 
     model = Budget
+    ordering = "-year"
     template_name = "budget_archive.html"
     context_object_name = "budgets"
 
+    def get_queryset(self):
+        # Totals and year over year changes for every budget in a single query
+        return super(BudgetArchives, self).get_queryset().with_changes()
+
     def get_context_data(self, **kwargs):
         context = super(BudgetArchives, self).get_context_data(**kwargs)
         context['dashboard'] = 'budget'
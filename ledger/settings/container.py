@@ -17,7 +17,7 @@ Configuration for container operations.
 import os
 
 from .base import *  # noqa
-from .base import PROJECT
+from .base import PROJECT, environ_setting
 
 
 ##########################################################################
@@ -35,3 +35,11 @@ ALLOWED_HOSTS = [
 ## Static files served by WhiteNoise
 STATIC_ROOT = os.path.join(PROJECT, 'static')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+## Share cached version stamps between the gunicorn workers in the container
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': environ_setting('CACHE_LOCATION', '/tmp/ledger-cache'),
+    }
+}
@@ -52,6 +52,15 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 STATIC_ROOT = os.path.join(PROJECT, 'static')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+## Cached version stamps are shared by the gunicorn workers of a pod on its local
+## filesystem; point CACHE_LOCATION at a shared volume when running several replicas
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': environ_setting('CACHE_LOCATION', '/tmp/ledger-cache'),
+    }
+}
+
 
 ##########################################################################
 ## Sentry Error Management
@@ -29,6 +29,7 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from rest_framework.routers import Route
 from rest_framework_nested import routers
 
 from ledger.views import HeartbeatViewSet, Overview
@@ -45,6 +46,19 @@ from budget.views import Subscriptions, SubscriptionCSVDownload
 ## Endpoint Discovery
 ##########################################################################
 
+class NestedBulkRouter(routers.NestedDefaultRouter):
+    """
+    Routes PATCH requests to the list endpoint of nested resources to the bulk_update
+    method of viewsets that implement it (other viewsets are routed as usual).
+    """
+
+    routes = [
+        route._replace(mapping={**route.mapping, "patch": "bulk_update"})
+        if isinstance(route, Route) and route.name == "{basename}-list" else route
+        for route in routers.NestedDefaultRouter.routes
+    ]
+
+
 # Top level router
 router = routers.DefaultRouter()
 router.register(r'status', HeartbeatViewSet, "status")
@@ -58,7 +72,7 @@ router.register(r'creditscore', CreditScoreViewSet, "creditscores")
 router.register(r'investments', Investments, "investments")
 
 # Routes nested below sheets
-sheets_router = routers.NestedDefaultRouter(router, r'sheets', lookup='sheet')
+sheets_router = NestedBulkRouter(router, r'sheets', lookup='sheet')
 sheets_router.register(r'balances', BalanceViewSet, basename='sheet-balances')
 sheets_router.register(r'transactions', TransactionViewSet, basename='sheet-transactions')
 
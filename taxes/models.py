@@ -15,9 +15,53 @@ Tax models
 ##########################################################################
 
 from django.db import models
+from django.db.models.functions import Cast, Lag
+from django.db.models import F, Q, Case, When, Window
 from django.utils.functional import cached_property
 
 
+# Fields compared with the previous year's return on the dashboard
+COMPARISON_FIELDS = ("income", "agi", "federal_tax", "local_tax")
+
+
+##########################################################################
+## Tax Return QuerySet
+##########################################################################
+
+class TaxReturnQuerySet(models.QuerySet):
+
+    def with_prev_year(self, fields=COMPARISON_FIELDS):
+        """
+        Annotates each return with prev_<field>, <field>_change, and <field>_percent
+        for each of the fields, compared with the return for the year before. These
+        are None if that year is not in the queryset (filtering by year removes it)
+        and the percent is None if the previous value is zero.
+        """
+        def lag(field):
+            return Window(expression=Lag(field), order_by=F("year").asc())
+
+        has_prev = Q(prev_year=F("year") - 1)
+        annotations = {}
+        for field in fields:
+            prev = f"prev_{field}"
+            annotations[prev] = Case(When(has_prev, then=lag(field)))
+            annotations[f"{field}_change"] = F(field) - F(prev)
+            annotations[f"{field}_percent"] = Case(
+                When(~Q(**{prev: 0}), then=(
+                    Cast(field, models.FloatField()) * 100.0
+                    / Cast(prev, models.FloatField())
+                )),
+                output_field=models.FloatField(),
+            )
+
+        return self.annotate(prev_year=lag("year")).annotate(**annotations)
+
+
+##########################################################################
+## Tax Return
+##########################################################################
+
+
 class TaxReturn(models.Model):
     """
     A model for data reported on IRS form 1040
@@ -76,6 +120,8 @@ class TaxReturn(models.Model):
         help_text="Total amount owed or paid in state and local taxes",
     )
 
+    objects = TaxReturnQuerySet.as_manager()
+
     @cached_property
     def prev_year_return(self):
         """
@@ -91,8 +137,17 @@ class TaxReturn(models.Model):
         """
         Returns the difference from last year to this year of the given field.
 
-        Returns 0 if there is no previous year to compare against.
+        Returns 0 if there is no previous year to compare against. Uses the
+        annotations of with_prev_year if available rather than querying.
         """
+        if hasattr(self, f"prev_{field}"):
+            if getattr(self, f"prev_{field}") is None:
+                return 0
+
+            if percent:
+                return getattr(self, f"{field}_percent") or 0
+            return getattr(self, f"{field}_change")
+
         if self.prev_year_return is None:
             return 0
 
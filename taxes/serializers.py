@@ -14,7 +14,7 @@ API serializers for taxes models
 ## Imports
 ##########################################################################
 
-from .models import TaxReturn
+from .models import TaxReturn, COMPARISON_FIELDS
 
 from rest_framework import serializers
 
@@ -25,9 +25,20 @@ from rest_framework import serializers
 
 class TaxReturnSerializer(serializers.HyperlinkedModelSerializer):
 
+    prev_year_changes = serializers.SerializerMethodField()
+
     class Meta:
         model = TaxReturn
         fields = "__all__"
         extra_kwargs = {
             "url": {"view_name": "api:returns-detail"}
         }
+
+    def get_prev_year_changes(self, obj):
+        return {
+            field: {
+                "change": obj.prev_year_change(field),
+                "percent": obj.prev_year_change(field, percent=True),
+            }
+            for field in COMPARISON_FIELDS
+        }
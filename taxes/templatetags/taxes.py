@@ -22,9 +22,10 @@ register = template.Library()
 
 @register.simple_tag()
 def prev_year_change(txr, field):
-    if txr.prev_year_change(field) > 0:
+    change = txr.prev_year_change(field)
+    if change > 0:
         icon = '<i class="mdi mdi-trending-up text-success"></i>'
-    elif txr.prev_year_change(field) == 0:
+    elif change == 0:
         icon = '<i class="mdi mdi-trending-flat"></i>'
     else:
         icon = '<i class="mdi mdi-trending-down text-danger"></i>'
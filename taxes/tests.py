@@ -13,3 +13,103 @@ Tax tests
 ##########################################################################
 ## Imports
 ##########################################################################
+
+import pytest
+
+from decimal import Decimal
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from taxes.models import TaxReturn, COMPARISON_FIELDS
+
+# All tests in this module use the database
+pytestmark = pytest.mark.django_db
+
+
+def make_return(year, income):
+    income = Decimal(income)
+    return TaxReturn.objects.create(
+        year=year, wages=income, income=income, agi=income * Decimal("0.9"),
+        taxable_income=income * Decimal("0.8"), federal_tax=income * Decimal("0.2"),
+        local_tax=0,
+    )
+
+
+@pytest.fixture()
+def tax_returns(db):
+    # Note that there is no return for 2017
+    return [
+        make_return(year, income)
+        for year, income in ((2015, 100000), (2016, 150000), (2018, 120000), (2019, 60000))
+    ]
+
+
+##########################################################################
+## Tax Return Tests
+##########################################################################
+
+def test_with_prev_year(tax_returns, django_assert_num_queries):
+    """
+    The previous year's values are annotated in a single query
+    """
+    with django_assert_num_queries(1):
+        returns = {txr.year: txr for txr in TaxReturn.objects.with_prev_year()}
+
+    assert returns[2015].prev_income is None
+    assert returns[2018].prev_income is None
+    assert returns[2016].prev_income == Decimal("100000")
+    assert returns[2016].income_change == Decimal("50000")
+    assert returns[2016].income_percent == 150.0
+    assert returns[2019].income_change == Decimal("-60000")
+    assert returns[2019].income_percent == 50.0
+
+    # Zero previous values have no percent change
+    assert returns[2019].prev_local_tax == 0
+    assert returns[2019].local_tax_percent is None
+
+
+@pytest.mark.parametrize("percent", [False, True])
+def test_prev_year_change_annotations(tax_returns, percent):
+    """
+    The annotated changes match the changes computed by querying
+    """
+    annotated = {txr.year: txr for txr in TaxReturn.objects.with_prev_year()}
+    for txr in TaxReturn.objects.all():
+        for field in COMPARISON_FIELDS:
+            expected = txr.prev_year_change(field, percent=percent)
+            assert annotated[txr.year].prev_year_change(field, percent=percent) == expected
+
+
+def test_taxes_dashboard_queries(admin_client, tax_returns):
+    """
+    The number of queries to render the dashboard does not grow with tax years
+    """
+    url = reverse("taxes")
+    with CaptureQueriesContext(connection) as queries:
+        assert admin_client.get(url).status_code == 200
+
+    for year in range(2020, 2025):
+        make_return(year, 100000 + year)
+
+    with CaptureQueriesContext(connection) as more_queries:
+        rep = admin_client.get(url)
+
+    assert len(rep.context["tax_returns"]) == 9
+    assert len(more_queries) == len(queries)
+
+
+def test_returns_api(admin_client, tax_returns):
+    """
+    The returns API includes the changes from the previous year
+    """
+    rep = admin_client.get(reverse("api:returns-list"))
+    assert rep.status_code == 200
+
+    changes = {item["year"]: item["prev_year_changes"] for item in rep.json()}
+    assert changes[2016]["income"] == {"change": 50000.0, "percent": 150.0}
+    assert changes[2018]["income"] == {"change": 0, "percent": 0}
+
+    rep = admin_client.get(reverse("api:returns-detail", kwargs={"pk": tax_returns[1].pk}))
+    assert rep.status_code == 200
+    assert rep.json()["prev_year_changes"]["income"] == {"change": 50000.0, "percent": 150.0}
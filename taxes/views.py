@@ -38,6 +38,10 @@ class TaxesDashboard(LoginRequiredMixin, ListView):
     template_name = "taxes.html"
     context_object_name = "tax_returns"
 
+    def get_queryset(self):
+        # Compare each return to the previous year in the same query
+        return super(TaxesDashboard, self).get_queryset().with_prev_year()
+
     def get_context_data(self, **kwargs):
         context = super(TaxesDashboard, self).get_context_data(**kwargs)
         context['dashboard'] = 'taxes'
@@ -77,3 +81,11 @@ class TaxReturnViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = TaxReturn.objects.all()
     serializer_class = TaxReturnSerializer
     permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        # The previous year must be in the queryset for the annotations, so a
+        # detail query falls back to querying the previous year's return.
+        queryset = super(TaxReturnViewSet, self).get_queryset()
+        if self.action == "list":
+            return queryset.with_prev_year()
+        return queryset